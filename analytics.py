@@ -0,0 +1,163 @@
+import argparse
+
+import pandas as pd
+
+import db_manager as db
+
+# ==============================================================================
+# ANALYTICS DO PAINEL ADMIN (AGREGADOS NO SQL)
+# ==============================================================================
+# Nada de SELECT * para contar linhas: o painel lê agregados e uma página de transações.
+#
+# daily_booking_summary = (dia, babysitter, status) -> reservas, receita, minutos reservados
+# e minutos de extensão. É o único resumo do painel (totais, gráficos, top babysitters),
+# por isso os números batem sempre entre si. É atualizado pelo db_manager na mesma
+# transação de cada escrita numa reserva; "python analytics.py --rebuild" refaz tudo.
+
+TRANSACTIONS_PAGE_SIZE = 25
+
+# período -> expressão SQL do início do período a partir de 'day'
+PERIODS = {
+    'day': "day",
+    'week': "date(day, '-6 days', 'weekday 1')",     # segunda-feira da semana
+    'month': "strftime('%Y-%m-01', day)",
+}
+
+
+def _summary_where(date_from, date_to, statuses):
+    where, params = ["1=1"], []
+    if date_from is not None:
+        where.append("day >= ?"); params.append(str(date_from))
+    if date_to is not None:
+        where.append("day <= ?"); params.append(str(date_to))
+    if statuses:
+        where.append(f"status IN ({', '.join('?' * len(statuses))})"); params.extend(statuses)
+    return ' AND '.join(where), params
+
+
+def get_overview():
+    """Métricas do topo do painel numa única query"""
+    conn = db.get_connection()
+    try:
+        row = conn.execute("""
+            SELECT (SELECT count(*) FROM users),
+                   (SELECT count(*) FROM users WHERE role = 'Cliente'),
+                   (SELECT count(*) FROM users WHERE role = 'Babysitter'),
+                   (SELECT coalesce(sum(bookings), 0) FROM daily_booking_summary),
+                   (SELECT coalesce(sum(revenue), 0) FROM daily_booking_summary),
+                   (SELECT coalesce(sum(bookings), 0) FROM daily_booking_summary WHERE status = 'Em Curso')
+        """).fetchone()
+    finally:
+        conn.close()
+    return dict(zip(('users', 'clients', 'babysitters', 'bookings', 'revenue', 'in_progress'), row))
+
+
+def revenue_by_period(period='day', date_from=None, date_to=None, statuses=None):
+    """DataFrame [Período, Reservas, Receita] a partir do resumo diário"""
+    where, params = _summary_where(date_from, date_to, statuses)
+    conn = db.get_connection()
+    try:
+        return pd.read_sql_query(f"""
+            SELECT {PERIODS[period]} AS Período, sum(bookings) AS Reservas, sum(revenue) AS Receita
+            FROM daily_booking_summary WHERE {where}
+            GROUP BY 1 ORDER BY 1
+        """, conn, params=params)
+    finally:
+        conn.close()
+
+
+def bookings_by_status(date_from=None, date_to=None):
+    """DataFrame [Status, Reservas, Receita]"""
+    where, params = _summary_where(date_from, date_to, None)
+    conn = db.get_connection()
+    try:
+        return pd.read_sql_query(f"""
+            SELECT status AS Status, sum(bookings) AS Reservas, sum(revenue) AS Receita
+            FROM daily_booking_summary WHERE {where}
+            GROUP BY status ORDER BY 2 DESC
+        """, conn, params=params)
+    finally:
+        conn.close()
+
+
+def utilisation_by_period(period='day', date_from=None, date_to=None):
+    """DataFrame [Período, Reservas, Receita, Horas, Horas extra] a partir do resumo diário"""
+    where, params = _summary_where(date_from, date_to, None)
+    conn = db.get_connection()
+    try:
+        return pd.read_sql_query(f"""
+            SELECT {PERIODS[period]} AS Período, sum(bookings) AS Reservas, sum(revenue) AS Receita,
+                   sum(booked_minutes) / 60.0 AS Horas, sum(extension_minutes) / 60.0 AS "Horas extra"
+            FROM daily_booking_summary WHERE {where}
+            GROUP BY 1 ORDER BY 1
+        """, conn, params=params)
+    finally:
+        conn.close()
+
+
+def top_sitters(limit=5, date_from=None, date_to=None):
+    """Babysitters com mais receita no período (agregado do resumo diário, só devolve 'limit' linhas)"""
+    where, params = _summary_where(date_from, date_to, None)
+    params.append(limit)
+    conn = db.get_connection()
+    try:
+        return pd.read_sql_query(f"""
+            SELECT u.name AS Babysitter, t.reservas AS Reservas, t.receita AS Receita, t.horas AS Horas
+            FROM (SELECT babysitter_id, sum(bookings) AS reservas, sum(revenue) AS receita,
+                         sum(booked_minutes + extension_minutes) / 60.0 AS horas
+                  FROM daily_booking_summary WHERE {where}
+                  GROUP BY babysitter_id ORDER BY receita DESC LIMIT ?) t
+            JOIN users u ON u.id = t.babysitter_id
+            ORDER BY t.receita DESC
+        """, conn, params=params)
+    finally:
+        conn.close()
+
+
+def list_transactions(after_id=None, limit=TRANSACTIONS_PAGE_SIZE, status=None, date_from=None, date_to=None, search=None):
+    """
+    Uma página de transações (mais recentes primeiro), paginada por id (keyset).
+    search procura no nome do cliente ou da babysitter.
+    Devolve (DataFrame, cursor da página seguinte ou None).
+    """
+    where, params = ["1=1"], []
+    if after_id is not None:
+        where.append("b.id < ?"); params.append(after_id)
+    if status:
+        where.append("b.status = ?"); params.append(status)
+    if date_from is not None:
+        where.append("b.service_date >= ?"); params.append(str(date_from))
+    if date_to is not None:
+        where.append("b.service_date <= ?"); params.append(str(date_to))
+    if search:
+        where.append("(cl.name LIKE ? OR s.name LIKE ?)"); params.extend([f"%{search}%"] * 2)
+    params.append(limit + 1)   # +1 para saber se há página seguinte
+    conn = db.get_connection()
+    try:
+        df = pd.read_sql_query(f"""
+            SELECT b.id, b.service_date AS "Data [date_iso]", b.start_time AS Hora,
+                   cl.name AS Cliente, s.name AS Babysitter, b.status AS Status,
+                   b.duration AS Horas, b.extension_minutes AS "Extensão (min)", b.total_price AS Valor
+            FROM bookings b
+            JOIN users cl ON cl.id = b.client_id
+            JOIN users s ON s.id = b.babysitter_id
+            WHERE {' AND '.join(where)}
+            ORDER BY b.id DESC LIMIT ?
+        """, conn, params=params)
+    finally:
+        conn.close()
+    if len(df) <= limit:
+        return df, None
+    df = df.iloc[:limit]
+    return df, int(df.iloc[-1]['id'])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Manutenção do resumo diário do painel admin")
+    parser.add_argument('db', nargs='?', default=db.DB_NAME)
+    parser.add_argument('--rebuild', action='store_true', required=True,
+                        help="Refazer daily_booking_summary a partir de bookings")
+    args = parser.parse_args()
+
+    db.configure_pool(args.db)
+    print(f"✅ Resumo diário refeito: {db.rebuild_daily_summary()} linha(s).")
@@ -1,17 +1,18 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-from datetime import datetime, timedelta, time as dt_time
+from datetime import datetime
 import time
 import calendar
-from geopy.geocoders import Nominatim
-from geopy.distance import geodesic
-from fpdf import FPDF
-import base64
-import re
+import html
 
 # --- LIGAÇÃO AO BACKEND ---
+import analytics
 import db_manager as db
+import invoices
+import safety
+from geocoding import get_geocoder
+import pricing
 
 # ==============================================================================
 # 1. CONFIGURAÇÃO E ESTILOS
@@ -53,6 +54,9 @@ st.markdown("""
     }
     .event-card.past { background-color: #f5f5f5; border-left: 3px solid #9e9e9e; color: #616161; }
     .current-day { border: 2px solid #9b59b6 !important; background-color: #fbf6ff; }
+    .cal-grid { display: grid; grid-template-columns: repeat(7, 1fr); gap: 6px; }
+    .cal-weekday { font-weight: bold; text-align: center; padding: 4px 0; }
+    .day-cell.empty { border: none; background-color: transparent; }
     
     /* TABELA DO ADMIN */
     .stDataFrame { width: 100%; }
@@ -63,100 +67,15 @@ st.markdown("""
 # 2. LÓGICA DE NEGÓCIO E UTILITÁRIOS
 # ==============================================================================
 def validate_address(address):
-    geolocator = Nominatim(user_agent="babyconnect_app_vfinal")
-    try:
-        location = geolocator.geocode(f"{address}, Portugal", timeout=10)
-        return location
-    except: return None
-
-def get_distance_km(dest_coords):
-    try:
-        loures_coords = (38.8315, -9.1746)
-        return geodesic(loures_coords, dest_coords).km
-    except: return None 
-
-def calcular_preco_total(babysitter_data, duracao_horas, location_obj):
-    preco_hora = babysitter_data.get('Preço/Hora') if isinstance(babysitter_data, dict) else babysitter_data['Preço/Hora']
-    custo_servico = preco_hora * duracao_horas
-    
-    dest_coords = (location_obj.latitude, location_obj.longitude)
-    distancia_ida = get_distance_km(dest_coords)
-    if distancia_ida is None: distancia_ida = 15.0 
-    
-    custo_deslocacao = (distancia_ida * 2) * 0.45
-    total = custo_servico + custo_deslocacao
-    
-    return {
-        "custo_servico": custo_servico, "distancia_ida": distancia_ida,
-        "custo_deslocacao": custo_deslocacao, "total": total
-    }
+    # Cache partilhada (memória + SQLite): só vai ao Nominatim para moradas novas
+    return get_geocoder().geocode(f"{address}, Portugal")
 
-def calculate_time_remaining(booking_data):
-    """Calcula tempo restante e progresso baseando-se no check-in real"""
-    if not booking_data.get('check_in_time'): return 0, 0, "Não iniciado"
-    
-    start = booking_data['check_in_time'] 
-    duration_min = (booking_data['duration'] * 60) + booking_data.get('extension_minutes', 0)
-    end_time = start + timedelta(minutes=duration_min)
-    now = datetime.now()
-    
-    remaining = end_time - now
-    total_seconds = remaining.total_seconds()
-    
-    if total_seconds <= 0: return 0, 1.0, "Terminado"
-    
-    minutes_left = int(total_seconds / 60)
-    total_duration_sec = duration_min * 60
-    progress = 1.0 - (total_seconds / total_duration_sec)
-    
-    return minutes_left, progress, end_time.strftime('%H:%M')
-
-def create_pdf_invoice(service_data):
-    pdf = FPDF()
-    pdf.add_page()
-    pdf.set_font("Arial", "B", 20)
-    pdf.cell(0, 10, "BabyConnect - Fatura Recibo", ln=True, align="C")
-    pdf.set_font("Arial", "", 10)
-    pdf.cell(0, 10, "Conectando Familias e Babysitters", ln=True, align="C")
-    pdf.line(10, 30, 200, 30)
-    pdf.ln(20)
-    pdf.set_font("Arial", "B", 12)
-    baba_nome = service_data.get('Babysitter') or service_data.get('BabysitterName') or "N/A"
-    cli_nome = service_data.get('Cliente') or service_data.get('ClientName') or st.session_state.get('user_name')
-    
-    pdf.cell(0, 10, f"Babysitter: {baba_nome}", ln=True)
-    pdf.set_font("Arial", "", 12)
-    pdf.cell(0, 10, f"Cliente: {cli_nome}", ln=True)
-    
-    data_serv = service_data.get('Data') or service_data.get('service_date')
-    if not isinstance(data_serv, str): data_serv = data_serv.strftime('%d/%m/%Y')
-    
-    pdf.cell(0, 10, f"Data do Servico: {data_serv}", ln=True)
-    local_str = str(service_data.get('Local', 'N/A')).encode('latin-1', 'replace').decode('latin-1')
-    pdf.cell(0, 10, f"Local: {local_str}", ln=True)
-    pdf.ln(10)
-    pdf.set_fill_color(240, 240, 240)
-    pdf.cell(140, 10, "Descricao", 1, 0, 'L', 1)
-    pdf.cell(50, 10, "Valor (EUR)", 1, 1, 'R', 1)
-    pdf.cell(140, 10, "Servico de Babysitting + Deslocacao", 1, 0, 'L')
-    pdf.cell(50, 10, f"{service_data.get('Valor', 0):.2f}", 1, 1, 'R')
-    pdf.set_font("Arial", "B", 12)
-    pdf.cell(140, 10, "TOTAL", 1, 0, 'R')
-    pdf.cell(50, 10, f"{service_data.get('Valor', 0):.2f} EUR", 1, 1, 'R')
-    pdf.ln(20)
-    pdf.set_font("Arial", "I", 10)
-    pdf.cell(0, 10, "Obrigado pela preferencia!", ln=True, align="C")
-    return pdf.output(dest='S').encode('latin-1')
-
-def check_safety_rules(text, history_context=""):
-    full_text = history_context + " " + text
-    if re.search(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b', full_text):
-        return False, "Proibido partilhar emails."
-    digits_only = re.sub(r'\D', '', full_text)
-    if len(digits_only) >= 9:
-        if digits_only[0] in ['9', '2', '3']:
-             return False, "Proibido partilhar contactos telefónicos."
-    return True, ""
+def service_timer(booking_id):
+    """(minutos restantes, progresso, hora de fim) calculados no SQL (db.get_active_service)"""
+    service = db.get_active_service(booking_id)
+    if service is None: return 0, 1.0, "Terminado"
+    if service.overdue: return 0, 1.0, f"Terminado ({service.scheduled_end.strftime('%H:%M')})"
+    return service.minutes_left, service.progress, service.scheduled_end.strftime('%H:%M')
 
 # ==============================================================================
 # 3. DADOS E STATE
@@ -167,7 +86,8 @@ keys_defaults = [
     ('current_page', "Dashboard"), ('booking_step', 1), ('temp_booking_data', {}),
     ('active_chat_user', None), ('checkout_data', None), 
     ('cal_year', datetime.now().year), ('cal_month', datetime.now().month),
-    ('selected_history_service', None), ('mensagens', [])
+    ('selected_history_service', None), ('mensagens', []), ('chat_buffers', {}),
+    ('watched_versions', {})
 ]
 for k, v in keys_defaults:
     if k not in st.session_state: st.session_state[k] = v
@@ -189,6 +109,27 @@ def nav_callback():
         st.session_state['booking_step'] = 1
         st.session_state['temp_booking_data'] = {}
 
+# ==============================================================================
+# 4b. REFRESH ORIENTADO A EVENTOS (CHANGE FEED)
+# ==============================================================================
+# Em vez de time.sleep + st.rerun, um fragmento leve lê as versões dos tópicos
+# (uma leitura indexada) e só faz rerun da página quando algo mudou.
+WATCH_INTERVAL = 3  # segundos
+
+def watch_changes(topics):
+    """Regista as versões atuais (o que a página vai mostrar) e liga o watcher"""
+    topics = tuple(topics)
+    st.session_state['watched_versions'][topics] = db.get_versions(topics)
+    change_watcher(topics)
+
+@st.fragment(run_every=WATCH_INTERVAL)
+def change_watcher(topics):
+    seen = st.session_state['watched_versions']
+    versions = db.get_versions(topics)
+    if seen.get(topics) != versions:
+        seen[topics] = versions
+        st.rerun(scope="app")
+
 def login_page():
     col1, col2, col3 = st.columns([1, 2, 1])
     with col2:
@@ -219,7 +160,14 @@ def render_navbar(menu_options):
         with col_user:
             c_name, c_notif, c_logout = st.columns([2, 1, 1])
             c_name.write(f"👤 **{st.session_state['user_name'].split()[0]}**")
-            c_notif.write("")
+            # Contador de não lidas (leitura por chave primária, reutilizada pelos dashboards)
+            notif = db.get_notification_summary(st.session_state['user_email'])
+            st.session_state['notif_summary'] = notif
+            if notif['unread'] > 0:
+                if c_notif.button(f"🔔 {notif['unread']}", help=f"Última mensagem de {notif['last_sender']}"):
+                    st.session_state['active_chat_user'] = notif['last_sender']
+                    go_to_page("Mensagens")
+            else: c_notif.write("")
             if c_logout.button("Sair"): st.session_state['logged_in'] = False; st.rerun()
         st.divider()
     if st.session_state['current_page'] != "Dashboard" and st.session_state['current_page'] not in menu_options:
@@ -228,42 +176,39 @@ def render_navbar(menu_options):
 # ==============================================================================
 # 5. DASHBOARDS (COM TEMPO REAL E EXTENSÕES)
 # ==============================================================================
+@st.fragment(run_every=10)
+def live_timer_cliente(active_job):
+    """Só o temporizador é redesenhado de 10 em 10 s (uma query indexada pela reserva)"""
+    mins_left, progress, end_str = service_timer(active_job.id)
+    st.subheader("Monitorização em Tempo Real")
+    st.markdown(f"<h1 style='color:#FF4B4B; margin:0'>{mins_left} min</h1>", unsafe_allow_html=True)
+    st.caption(f"Previsão de fim: {end_str}")
+    st.progress(max(0.0, min(1.0, progress)))
+
 def page_dashboard_cliente():
     st.header(f"Olá, {st.session_state['user_name']}")
     
-    # --- O CÓDIGO TEM DE ESTAR ALINHADO AQUI ---
-    # VERIFICAR SE HÁ MENSAGENS (Notificação)
-    try:
-        conn = db.get_connection()
-        # A linha que deu erro tem de estar encostada a este nível de indentação
-        msgs = pd.read_sql("SELECT * FROM messages ORDER BY timestamp DESC LIMIT 1", conn)
-        conn.close()
-        
-        if not msgs.empty:
-            # ... resto da lógica ...
-            pass
-    except Exception:
-        pass
+    # Mensagens não lidas (já lidas pela navbar neste rerun)
+    unread = st.session_state.get('notif_summary', {}).get('unread', 0)
+    
+    # Refresh quando as reservas do cliente mudam (ex: extensão aceite) ou chega mensagem.
+    # Versões lidas ANTES dos dados: uma alteração entre as duas leituras não se perde.
+    watch_changes([db.user_bookings_topic(st.session_state['user_id']), db.inbox_topic(st.session_state['user_email'])])
     
     # 1. VERIFICAR SE EXISTE SERVIÇO EM CURSO
     active_job = db.get_upcoming_or_active_booking(st.session_state['user_id'], 'Cliente')
     
-    if active_job and active_job['status'] == 'Em Curso':
-        mins_left, progress, end_str = calculate_time_remaining(active_job)
-        
+    if active_job and active_job.status == 'Em Curso':
         # --- CÁLCULOS FINANCEIROS ---
-        pending = active_job.get('pending_extension', 0)
-        extra_min = active_job.get('extension_minutes', 0)
-        total_price = active_job.get('total_price', 0.0)
+        pending = active_job.pending_extension
+        extra_min = active_job.extension_minutes
+        total_price = active_job.total_price or 0.0
         
         # Card Principal (Timer)
         with st.container(border=True):
             col_timer, col_actions = st.columns([1.5, 1])
             with col_timer:
-                st.subheader("Monitorização em Tempo Real")
-                st.markdown(f"<h1 style='color:#FF4B4B; margin:0'>{mins_left} min</h1>", unsafe_allow_html=True)
-                st.caption(f"Previsão de fim: {end_str}")
-                st.progress(max(0.0, min(1.0, progress)))
+                live_timer_cliente(active_job)
                 
                 # [NOVO] CARD DE CONFIRMAÇÃO DE PAGAMENTO
                 # Só aparece se houver extensões aprovadas
@@ -286,7 +231,7 @@ def page_dashboard_cliente():
                 st.markdown("### Ações")
                 
                 if st.button("💬 Chat com Babysitter", type="primary", use_container_width=True):
-                    st.session_state['active_chat_user'] = active_job['BabysitterEmail']
+                    st.session_state['active_chat_user'] = active_job.other_email
                     st.session_state['current_page'] = "Mensagens"
                     st.rerun()
                 
@@ -298,38 +243,29 @@ def page_dashboard_cliente():
                      st.caption("O débito será feito após aceitação.")
                 else:
                     st.write("**Precisa de mais tempo?**")
-                    preco_hora = active_job.get('price_per_hour', 10.0)
+                    preco_hora = active_job.price_per_hour or 10.0
                     custo_15min = preco_hora / 4
                     
                     if st.button(f"➕ Pedir +15 min (+€{custo_15min:.2f})", use_container_width=True):
-                        db.request_extension_db(active_job['id'], 15)
+                        db.request_extension_db(active_job.id, 15)
                         st.toast("Pedido enviado!")
                         time.sleep(1)
                         st.rerun()
 
         st.markdown("---")
-        
-        # AUTO-REFRESH (A cada 10s verifica se a Babysitter aceitou)
-        time.sleep(10)
-        st.rerun()
 
     # 2. DASHBOARD NORMAL (Sem serviço ativo)
     else:
-        df = db.get_user_bookings(st.session_state['user_id'], 'Cliente')
-        if df.empty:
-            pedidos_passados = pd.DataFrame(); pedidos_futuros = pd.DataFrame()
-            count_passados = 0; count_futuros = 0
-        else:
-            hoje = datetime.now().date()
-            df['Data'] = pd.to_datetime(df['service_date']).dt.date
-            pedidos_futuros = df[df['Data'] >= hoje]
-            pedidos_passados = df[df['Data'] < hoje]
-            count_passados = len(pedidos_passados); count_futuros = len(pedidos_futuros)
+        # Contagens, 3 últimos e próximos: o corte passado/futuro e a ordenação são feitos no SQL
+        uid = st.session_state['user_id']
+        contagem = db.count_user_bookings(uid, 'Cliente')
+        pedidos_passados = db.get_user_bookings(uid, 'Cliente', columns=('id', 'Data', 'Babysitter', 'Valor'), when='past', limit=3)
+        pedidos_futuros = db.get_user_bookings(uid, 'Cliente', columns=('Data', 'Hora', 'Babysitter', 'Status', 'Valor'), when='future')
         
         c1, c2, c3 = st.columns(3)
-        c1.metric("Serviços Realizados", count_passados)
-        c2.metric("Pedidos Futuros", count_futuros)
-        c3.metric("Mensagens", "0") 
+        c1.metric("Serviços Realizados", contagem['past'])
+        c2.metric("Pedidos Futuros", contagem['future'])
+        c3.metric("Mensagens", unread)
 
         col_new, col_history = st.columns(2)
         with col_new:
@@ -344,90 +280,75 @@ def page_dashboard_cliente():
                 st.subheader("📜 Histórico Recente")
                 if pedidos_passados.empty: st.info("Ainda não tem histórico.")
                 else:
-                    for idx, row in pedidos_passados.head(3).iterrows():
+                    for _, row in pedidos_passados.iterrows():
                         with st.container(border=True):
                             col_info, col_act = st.columns([3, 1])
                             with col_info:
                                 st.write(f"**{row['Babysitter']}**")
                                 st.caption(f"📅 {row['Data'].strftime('%d/%m/%Y')} | € {row['Valor']:.2f}")
                             with col_act:
-                                if st.button("📄", key=f"hist_{idx}"):
+                                if st.button("📄 Detalhes", key=f"hist_{row['id']}"):
                                     st.session_state['selected_history_service'] = row.to_dict()
                                     go_to_page("Detalhes Serviço")
         
         st.markdown("---")
         st.subheader("📅 Próximos Pedidos")
         if pedidos_futuros.empty: st.info("Não tem pedidos agendados.")
-        else: st.dataframe(pedidos_futuros[['Data', 'Hora', 'Babysitter', 'Status', 'Valor']], use_container_width=True, hide_index=True)
+        else: st.dataframe(pedidos_futuros, use_container_width=True, hide_index=True)
 
-    # 2. DASHBOARD NORMAL
-    df = db.get_user_bookings(st.session_state['user_id'], 'Cliente')
-    if df.empty:
-        pedidos_passados = pd.DataFrame(); pedidos_futuros = pd.DataFrame()
-        count_passados = 0; count_futuros = 0
-    else:
-        hoje = datetime.now().date()
-        df['Data'] = pd.to_datetime(df['service_date']).dt.date
-        pedidos_futuros = df[df['Data'] >= hoje]
-        pedidos_passados = df[df['Data'] < hoje]
-        count_passados = len(pedidos_passados); count_futuros = len(pedidos_futuros)
-    
-    c1, c2, c3 = st.columns(3)
-    c1.metric("Serviços Realizados", count_passados)
-    c2.metric("Pedidos Futuros", count_futuros)
-    c3.metric("Mensagens", "0") 
 
-    col_new, col_history = st.columns(2)
-    with col_new:
-        with st.container(border=True):
-            st.subheader("➕ Novo Pedido Rápido")
-            st.write("Definir data e encontrar babysitter.")
-            if st.button("Criar Novo Pedido", use_container_width=True, type="primary"): 
-                go_to_page("Novo Serviço", reset_step=True) 
-    
-    with col_history:
-        with st.container(border=True):
-            st.subheader("📜 Histórico Recente")
-            if pedidos_passados.empty: st.info("Ainda não tem histórico.")
-            else:
-                for idx, row in pedidos_passados.head(3).iterrows():
-                    with st.container(border=True):
-                        col_info, col_act = st.columns([3, 1])
-                        with col_info:
-                            st.write(f"**{row['Babysitter']}**")
-                            st.caption(f"📅 {row['Data'].strftime('%d/%m/%Y')} | € {row['Valor']:.2f}")
-                        with col_act:
-                            if st.button("📄 Detalhes", key=f"hist_{idx}"):
-                                st.session_state['selected_history_service'] = row.to_dict()
-                                go_to_page("Detalhes Serviço")
+@st.fragment(run_every=30)
+def pre_service_card(active_job):
+    """Cartão do próximo serviço: o check-in abre 15 min antes (redesenhado a cada 30 s)"""
+    job_dt = datetime.combine(active_job.service_date, active_job.start_time)
+    diff = (job_dt - datetime.now()).total_seconds() / 60 
     
-    st.markdown("---")
-    st.subheader("📅 Próximos Pedidos")
-    if pedidos_futuros.empty: st.info("Não tem pedidos agendados.")
-    else: st.dataframe(pedidos_futuros[['Data', 'Hora', 'Babysitter', 'Status', 'Valor']], use_container_width=True, hide_index=True)
-
+    with st.container(border=True):
+        st.subheader("🚀 Próximo Serviço")
+        st.write(f"**Cliente:** {active_job.other_name}")
+        st.write(f"**Horário:** {active_job.start_time.strftime('%H:%M')}")
+        
+        if diff <= 15: 
+            st.success("Pode iniciar.")
+            with st.form("checkin_form"):
+                febre = st.toggle("Febre?")
+                marcas = st.text_area("Marcas?", placeholder="Descreva...")
+                if st.form_submit_button("▶️ INICIAR", type="primary", use_container_width=True):
+                    db.start_service_db(active_job.id, f"Febre:{febre}|Marcas:{marcas}")
+                    st.rerun(scope="app")
+        else: st.warning(f"Check-in brevemente ({int(diff)} min).")
+
+@st.fragment(run_every=10)
+def live_timer_babysitter(active_job):
+    mins_left, progress, end_str = service_timer(active_job.id)
+    st.markdown(f"""
+    <div style="background-color: #e3f2fd; padding: 20px; border-radius: 10px; border: 2px solid #2196f3; text-align: center; margin-bottom: 20px;">
+        <h2 style="color: #1565c0; margin:0;">EM SERVIÇO 🟢</h2>
+        <h1 style="font-size: 50px; margin: 0;">{mins_left} min</h1>
+        <p>Restantes • Termina às {end_str}</p>
+    </div>
+    """, unsafe_allow_html=True)
+    st.progress(max(0.0, min(1.0, progress)))
 
 def page_dashboard_babysitter():
     st.header(f"🧸 Painel Babysitter: {st.session_state['user_name']}")
     
-    conn = db.get_connection()
-    msgs = pd.read_sql("SELECT * FROM messages ORDER BY timestamp DESC LIMIT 1", conn)
-    conn.close()
+    # Notificação de mensagens (contador do próprio utilizador, já lido pela navbar)
+    notif = st.session_state.get('notif_summary') or db.get_notification_summary(st.session_state['user_email'])
+    if notif['unread'] > 0:
+        st.info(f"📨 **{notif['unread']} mensagem(ns) nova(s) de {notif['last_sender']}!** Vá ao menu Mensagens.")
+    # Refresh quando as reservas mudam (ex: pedido de extensão) ou chega mensagem
+    watch_changes([db.user_bookings_topic(st.session_state['user_id']), db.inbox_topic(st.session_state['user_email'])])
     
-    if not msgs.empty:
-        last_msg_time = pd.to_datetime(msgs.iloc[0]['timestamp'])
-        # Se a mensagem tem menos de 2 minutos e não fui eu que enviei
-        if (datetime.now() - last_msg_time).total_seconds() < 120 and msgs.iloc[0]['sender_email'] != st.session_state['user_email']:
-             st.info(f"📨 **Nova mensagem de {msgs.iloc[0]['sender_email']}!** Vá ao menu Mensagens.")
     # 1. BUSCAR DADOS (Query fresca)
     active_job = db.get_upcoming_or_active_booking(st.session_state['user_id'], 'Babysitter')
     
     if active_job:
-        status = active_job['status']
+        status = active_job.status
         
         # --- AQUI ESTÁ A CORREÇÃO DO POP-UP ---
         # Verificamos sempre se há pedidos pendentes, independentemente do status
-        pending = active_job.get('pending_extension', 0)
+        pending = active_job.pending_extension
         
         if pending > 0:
             # POP-UP VISUAL DE ALERTA
@@ -435,88 +356,195 @@ def page_dashboard_babysitter():
                 st.error(f"🔔 **PEDIDO URGENTE:** Os pais querem +{pending} minutos!")
                 c1, c2 = st.columns(2)
                 if c1.button("✅ ACEITAR MUDANÇA", use_container_width=True):
-                    custo_extra = (pending / 60) * 10.0
-                    db.resolve_extension_db(active_job['id'], True, pending, custo_extra)
+                    custo_extra = (pending / 60) * db.get_babysitter_price(st.session_state['user_id'])
+                    db.resolve_extension_db(active_job.id, True, pending, custo_extra)
                     st.success("Aceite!"); time.sleep(1); st.rerun()
                 if c2.button("❌ RECUSAR MUDANÇA", use_container_width=True):
-                    db.resolve_extension_db(active_job['id'], False, 0, 0)
+                    db.resolve_extension_db(active_job.id, False, 0, 0)
                     st.error("Recusado."); time.sleep(1); st.rerun()
         # ---------------------------------------
 
         # A) PRÉ-SERVIÇO
         if status == 'Confirmado':
-            job_dt = datetime.combine(active_job['Data'], active_job['Hora'])
-            diff = (job_dt - datetime.now()).total_seconds() / 60 
-            
-            with st.container(border=True):
-                st.subheader("🚀 Próximo Serviço")
-                st.write(f"**Cliente:** {active_job.get('ClientName')}")
-                st.write(f"**Horário:** {active_job['Hora'].strftime('%H:%M')}")
-                
-                if diff <= 15: 
-                    st.success("Pode iniciar.")
-                    with st.form("checkin_form"):
-                        febre = st.toggle("Febre?")
-                        marcas = st.text_area("Marcas?", placeholder="Descreva...")
-                        if st.form_submit_button("▶️ INICIAR", type="primary", use_container_width=True):
-                            db.start_service_db(active_job['id'], f"Febre:{febre}|Marcas:{marcas}")
-                            st.rerun()
-                else: st.warning(f"Check-in brevemente ({int(diff)} min).")
-            
-            # Refresh lento (30s) enquanto espera
-            time.sleep(30)
-            st.rerun()
+            pre_service_card(active_job)
 
         # B) EM SERVIÇO
         elif status == 'Em Curso':
-            mins_left, progress, end_str = calculate_time_remaining(active_job)
-            st.markdown(f"""
-            <div style="background-color: #e3f2fd; padding: 20px; border-radius: 10px; border: 2px solid #2196f3; text-align: center; margin-bottom: 20px;">
-                <h2 style="color: #1565c0; margin:0;">EM SERVIÇO 🟢</h2>
-                <h1 style="font-size: 50px; margin: 0;">{mins_left} min</h1>
-                <p>Restantes • Termina às {end_str}</p>
-            </div>
-            """, unsafe_allow_html=True)
-            st.progress(max(0.0, min(1.0, progress)))
+            live_timer_babysitter(active_job)
             
-            if st.button("💬 Chat com Pais", use_container_width=True):
-                st.session_state['active_chat_user'] = active_job['ClientEmail']
+            c_chat, c_fim = st.columns(2)
+            if c_chat.button("💬 Chat com Pais", use_container_width=True):
+                st.session_state['active_chat_user'] = active_job.other_email
                 st.session_state['current_page'] = "Mensagens"
                 st.rerun()
+            if c_fim.button("✅ Terminar Serviço", use_container_width=True):
+                if db.finish_service_db(active_job.id):
+                    # A fatura fica pronta em segundo plano para quando o cliente a abrir
+                    invoices.prerender_async(active_job.id)
+                    st.success("Serviço concluído!"); time.sleep(1); st.rerun()
             
             st.divider()
-            
-            # --- CORREÇÃO: REFRESH RÁPIDO (5s) ---
-            # Isto garante que ela vê os pedidos de extensão quase logo que acontecem
-            time.sleep(5)
-            st.rerun()
 
     # 2. AGENDA
-    df = db.get_user_bookings(st.session_state['user_id'], 'Babysitter')
+    df = db.get_user_bookings(st.session_state['user_id'], 'Babysitter', columns=('Data', 'Hora', 'Cliente', 'Status', 'Local', 'Valor'))
     if df.empty: st.info("Sem agenda.")
-    else: 
-        cols = [c for c in ['Data', 'Hora', 'Cliente', 'Status', 'Local', 'Valor'] if c in df.columns]
-        st.dataframe(df[cols], use_container_width=True)
+    else: st.dataframe(df, use_container_width=True)
 
 
+ADMIN_STATUSES = ["Todos", "Confirmado", "Em Curso", "Concluído"]
+
+@st.fragment(run_every=30)
+def admin_active_services():
+    """Vista de operações: todos os serviços em curso (tempo restante calculado no SQL)"""
+    st.subheader("🟢 Serviços em Curso")
+    servicos = db.get_active_services()
+    if not servicos: st.info("Nenhum serviço em curso."); return
+    st.dataframe(pd.DataFrame([{
+        'Reserva': s.id, 'Cliente': s.client_name, 'Babysitter': s.babysitter_name,
+        'Início': s.check_in_time.strftime('%H:%M'), 'Fim previsto': s.scheduled_end.strftime('%H:%M'),
+        'Restante (min)': s.minutes_left, 'Progresso': s.progress,
+        'Extensão pendente': s.pending_extension or None,
+    } for s in servicos]), use_container_width=True, hide_index=True,
+        column_config={'Progresso': st.column_config.ProgressColumn(min_value=0.0, max_value=1.0)})
+
 def page_admin_dashboard():
     st.header("🔐 Painel Admin Global")
-    conn = db.get_connection()
-    df_users = pd.read_sql("SELECT * FROM users", conn)
-    df_bookings = pd.read_sql("SELECT * FROM bookings", conn)
-    conn.close()
+    resumo = analytics.get_overview()
     
-    c1, c2 = st.columns(2)
-    c1.metric("Utilizadores Totais", len(df_users))
-    c2.metric("Reservas Totais", len(df_bookings))
+    c1, c2, c3, c4 = st.columns(4)
+    c1.metric("Utilizadores Totais", resumo['users'], help=f"{resumo['clients']} clientes | {resumo['babysitters']} babysitters")
+    c2.metric("Reservas Totais", resumo['bookings'])
+    c3.metric("Receita Total", f"€ {resumo['revenue']:.2f}")
+    c4.metric("Serviços em Curso", resumo['in_progress'])
     
     st.markdown("---")
-    st.subheader("Todas as Transações")
-    st.dataframe(df_bookings, use_container_width=True)
+    g1, g2 = st.columns([2, 1])
+    with g1:
+        periodo = st.radio("Agrupar por", ["Dia", "Semana", "Mês"], horizontal=True)
+        uso = analytics.utilisation_by_period({"Dia": 'day', "Semana": 'week', "Mês": 'month'}[periodo])
+        if uso.empty: st.info("Sem dados.")
+        else:
+            t_receita, t_horas = st.tabs(["Receita", "Horas"])
+            t_receita.plotly_chart(px.bar(uso, x='Período', y='Receita', hover_data=['Reservas']), use_container_width=True)
+            t_horas.plotly_chart(px.bar(uso, x='Período', y=['Horas', 'Horas extra']), use_container_width=True)
+    with g2:
+        st.subheader("Por Estado")
+        st.dataframe(analytics.bookings_by_status(), use_container_width=True, hide_index=True)
+        st.subheader("Top Babysitters")
+        st.dataframe(analytics.top_sitters(), use_container_width=True, hide_index=True)
+    
+    st.markdown("---")
+    admin_active_services()
+    
+    st.markdown("---")
+    st.subheader("Transações")
+    f1, f2, f3 = st.columns([1, 1, 2])
+    estado = f1.selectbox("Estado", ADMIN_STATUSES)
+    desde = f2.date_input("Desde", value=None)
+    pesquisa = f3.text_input("Procurar cliente / babysitter")
+    filtros = {'status': None if estado == "Todos" else estado, 'date_from': desde, 'search': pesquisa or None}
+    
+    # Paginação por id (pilha de cursores), reiniciada quando os filtros mudam
+    pag_key = tuple(filtros.values())
+    pag = st.session_state.get('admin_tx_pages')
+    if not pag or pag['key'] != pag_key:
+        pag = st.session_state['admin_tx_pages'] = {'key': pag_key, 'cursors': [None], 'page': 0}
+    
+    transacoes, next_cursor = analytics.list_transactions(after_id=pag['cursors'][pag['page']], **filtros)
+    if transacoes.empty: st.info("Sem transações.")
+    else: st.dataframe(transacoes, use_container_width=True, hide_index=True)
+    
+    p_prev, p_info, p_next = st.columns([1, 2, 1])
+    if pag['page'] > 0 and p_prev.button("⬅ Anterior", use_container_width=True):
+        pag['page'] -= 1; st.rerun()
+    p_info.caption(f"Página {pag['page'] + 1}")
+    if next_cursor is not None and p_next.button("Seguinte ➡", use_container_width=True):
+        del pag['cursors'][pag['page'] + 1:]
+        pag['cursors'].append(next_cursor)
+        pag['page'] += 1; st.rerun()
+
+# ==============================================================================
+# 5b. DETALHES DE UM SERVIÇO (FATURA)
+# ==============================================================================
+@st.fragment(run_every=1)
+def invoice_pending(booking_id):
+    """Só consulta a fila em memória (sem BD); quando a geração termina, redesenha a página uma vez"""
+    if invoices.is_pending(booking_id):
+        st.caption("⏳ A preparar a fatura...")
+    else:
+        st.rerun(scope="app")
+
+def invoice_download(billing):
+    """Botão de download; se a fatura ainda não existe, é gerada em segundo plano"""
+    booking_id = billing['id']
+    pdf_bytes = invoices.get_cached_invoice(booking_id, billing)
+    tentativas = st.session_state.setdefault('invoice_attempts', set())
+    if pdf_bytes is None:
+        if booking_id not in tentativas:
+            tentativas.add(booking_id)
+            invoices.prerender_async(booking_id)
+            invoice_pending(booking_id)
+            return
+        # O segundo plano já tentou sem sucesso: gera aqui
+        pdf_bytes = invoices.get_invoice_pdf(booking_id)
+    tentativas.discard(booking_id)
+    st.download_button("📄 Descarregar Fatura (PDF)", pdf_bytes, file_name=f"fatura_{booking_id}.pdf",
+                       mime="application/pdf", use_container_width=True)
+
+def page_detalhes_servico():
+    st.header("🧾 Detalhes do Serviço")
+    if st.button("⬅ Voltar"): go_to_page("Dashboard")
+    servico = st.session_state.get('selected_history_service') or {}
+    billing = invoices.load_billing(servico['id']) if servico.get('id') is not None else None
+    if billing is None: st.error("Serviço não encontrado."); return
+    
+    with st.container(border=True):
+        c1, c2 = st.columns(2)
+        c1.write(f"**Babysitter:** {billing['babysitter_name']}")
+        c1.write(f"**Data:** {billing['service_date']} às {billing['start_time']}")
+        c1.write(f"**Local:** {billing['address']}")
+        c2.write(f"**Duração:** {billing['duration']}h" + (f" + {billing['extension_minutes']} min" if billing['extension_minutes'] else ""))
+        c2.metric("Total", f"€ {billing['total_price'] or 0:.2f}")
+    invoice_download(billing)
 
 # ==============================================================================
 # 6. WIZARD DE PEDIDOS
 # ==============================================================================
+NEAREST_K = 50             # Máximo de babysitters consideradas em "Mais próximas"
+PRICED_K = 200             # Candidatas (as mais próximas) ordenadas em "Preço total"
+NEAREST_RADIUS_KM = 30.0
+SITTER_PAGE_SIZE = 10
+# 'distance' e 'total' partem das mais próximas (paginadas em memória); as outras são keyset no SQL
+SITTER_SORTS = {"Mais próximas": 'distance', "Preço total": 'total', "Avaliação": 'rating', "Preço/hora": 'price'}
+
+def load_sitter_page(ordem, pag, loc, intervalo, filtros, duracao):
+    """
+    Página atual do passo 2: (DataFrame, cursor da página seguinte ou None, fallback).
+    fallback=True quando não há ninguém perto e a lista é a ordenada por avaliação.
+    """
+    sort = SITTER_SORTS[ordem]
+    if sort in ('distance', 'total'):
+        # K limitado pela grelha geoespacial, paginado em memória
+        k = NEAREST_K if sort == 'distance' else PRICED_K
+        perto = db.find_nearest_babysitters(loc.latitude, loc.longitude, k=k, radius_km=NEAREST_RADIUS_KM, available_for=intervalo)
+        if not perto.empty:
+            if filtros['max_price']: perto = perto[perto['Preço/Hora'] <= filtros['max_price']]
+            if filtros['min_rating']: perto = perto[perto['Avaliação'] >= filtros['min_rating']]
+            if sort == 'total':
+                # Preço (serviço + deslocação) de todas as candidatas num só passo vetorizado, antes de paginar
+                perto = pricing.price_candidates(perto, duracao, loc.latitude, loc.longitude, sort_by='total')
+            inicio = pag['page'] * SITTER_PAGE_SIZE
+            fim = inicio + SITTER_PAGE_SIZE
+            return perto.iloc[inicio:fim], (fim if fim < len(perto) else None), False
+        # Nenhuma babysitter disponível a menos de NEAREST_RADIUS_KM (ou nenhuma com coordenadas):
+        # listagem de todas por avaliação, com aviso no passo 2
+        df, cursor = db.list_babysitters_page('rating', after=pag['cursors'][pag['page']], limit=SITTER_PAGE_SIZE,
+                                              available_for=intervalo, **filtros)
+        return df, cursor, True
+    df, cursor = db.list_babysitters_page(sort, after=pag['cursors'][pag['page']], limit=SITTER_PAGE_SIZE,
+                                          available_for=intervalo, **filtros)
+    return df, cursor, False
+
 def page_novo_servico():
     step = st.session_state['booking_step']
     
@@ -550,9 +578,32 @@ def page_novo_servico():
         st.progress(66)
         if st.button("⬅ Voltar"): st.session_state['booking_step'] = 1; st.rerun()
         st.divider()
-        disponiveis = db.get_all_babysitters()
-        if disponiveis.empty: st.warning("Não existem babysitters registadas.")
+        loc = data_pedido['location_obj']
+        # Só quem não tem reservas ativas sobrepostas ao horário pedido
+        intervalo = db.booking_interval(data_pedido['data'], data_pedido['hora'], data_pedido['duracao'])
+        
+        # Filtros e ordenação (aplicados no SQL)
+        f1, f2, f3 = st.columns([2, 1, 1])
+        ordem = f1.radio("Ordenar por", list(SITTER_SORTS), horizontal=True)
+        preco_max = f2.number_input("Preço máx. €/hora (0 = sem limite)", min_value=0.0, value=0.0, step=1.0)
+        aval_min = f3.select_slider("Avaliação mínima", options=[0.0, 3.0, 3.5, 4.0, 4.5, 5.0], value=0.0)
+        filtros = {'max_price': preco_max or None, 'min_rating': aval_min or None}
+        
+        # Paginação: pilha de cursores (keyset), reiniciada quando os filtros mudam
+        pag_key = (ordem, preco_max, aval_min, intervalo)
+        pag = st.session_state.get('sitter_pages')
+        if not pag or pag['key'] != pag_key:
+            pag = st.session_state['sitter_pages'] = {'key': pag_key, 'cursors': [None], 'page': 0}
+        
+        disponiveis, next_cursor, fallback = load_sitter_page(ordem, pag, loc, intervalo, filtros, data_pedido['duracao'])
+        if fallback and not disponiveis.empty:
+            st.info(f"Nenhuma babysitter disponível a menos de {NEAREST_RADIUS_KM:.0f} km desta morada. "
+                    "A mostrar todas as disponíveis, ordenadas por avaliação.")
+        if disponiveis.empty: st.warning("Não existem babysitters disponíveis com estes critérios.")
         else:
+            # Nas outras ordenações, preço só das candidatas desta página (mantém a ordem do SQL)
+            if 'total' not in disponiveis:
+                disponiveis = pricing.price_candidates(disponiveis, data_pedido['duracao'], loc.latitude, loc.longitude, sort_by=None)
             for idx, row in disponiveis.iterrows():
                 with st.container(border=True):
                     c_img, c_info, c_btn = st.columns([1, 4, 1.5])
@@ -560,15 +611,25 @@ def page_novo_servico():
                     with c_img: st.image(foto, width=100)
                     with c_info: 
                         primeiro_nome = row['Nome'].split()[0]
-                        st.subheader(primeiro_nome); st.write(f"📝 *{row['Bio']}*"); st.caption(f"📍 {row['Localização']} | ⭐ {row['Avaliação']}")
+                        st.subheader(primeiro_nome); st.write(f"📝 *{row['Bio']}*"); st.caption(f"📍 {row['Localização']} | ⭐ {row['Avaliação']} | 🚗 {row['distancia_ida']:.1f} km")
                     with c_btn:
-                        st.write(""); st.write("")
-                        if st.button("Selecionar ✅", key=f"select_{idx}", type="primary", use_container_width=True):
-                            calculo = calcular_preco_total(row.to_dict(), data_pedido['duracao'], data_pedido['location_obj'])
+                        st.markdown(f"**€ {row['total']:.2f}**")
+                        if st.button("Selecionar ✅", key=f"select_{row['id']}", type="primary", use_container_width=True):
+                            calculo = pricing.quote_from_row(row)
                             st.session_state['checkout_data'] = {'babysitter': row.to_dict(), 'babysitter_primeiro_nome': primeiro_nome, **data_pedido, 'calculo': calculo}
                             st.session_state['booking_step'] = 3
                             st.rerun()
 
+            # Navegação entre páginas
+            p_prev, p_info, p_next = st.columns([1, 2, 1])
+            if pag['page'] > 0 and p_prev.button("⬅ Anterior", use_container_width=True):
+                pag['page'] -= 1; st.rerun()
+            p_info.caption(f"Página {pag['page'] + 1}")
+            if next_cursor is not None and p_next.button("Seguinte ➡", use_container_width=True):
+                del pag['cursors'][pag['page'] + 1:]
+                pag['cursors'].append(next_cursor)
+                pag['page'] += 1; st.rerun()
+
     elif step == 3:
         st.header("Passo 3 de 3: Pagamento Seguro")
         st.progress(100)
@@ -595,117 +656,214 @@ def page_novo_servico():
             if st.button(f"Pagar € {calc['total']:.2f} e Confirmar", type="primary", use_container_width=True):
                 with st.spinner("A processar pagamento..."):
                     time.sleep(1) 
-                    sucesso = db.create_booking(st.session_state['user_id'], data['babysitter'], data)
-                    if sucesso: st.balloons(); st.success("Reserva confirmada!"); time.sleep(2); go_to_page("Dashboard", reset_step=True)
-                    else: st.error("Erro ao gravar na base de dados.")
+                    try:
+                        sucesso = db.create_booking(st.session_state['user_id'], data['babysitter'], data)
+                    except db.BookingConflictError:
+                        st.error("A babysitter já não está disponível neste horário. Escolha outra.")
+                    else:
+                        if sucesso: st.balloons(); st.success("Reserva confirmada!"); time.sleep(2); go_to_page("Dashboard", reset_step=True)
+                        else: st.error("Erro ao gravar na base de dados.")
 
 # ==============================================================================
 # 7. CALENDÁRIO
 # ==============================================================================
+CAL_WEEKDAYS = ["Seg", "Ter", "Qua", "Qui", "Sex", "Sáb", "Dom"]   # calendar.monthcalendar começa à segunda
+
+def month_events(user_id, role, year, month):
+    """{data: [(hora, nome, status), ...]} só com as reservas do mês (uma query + um groupby)"""
+    other = 'Babysitter' if role == 'Cliente' else 'Cliente'
+    first = datetime(year, month, 1).date()
+    last = first.replace(day=calendar.monthrange(year, month)[1])
+    df = db.get_user_bookings(user_id, role, columns=('Data', 'Hora', other, 'Status'), date_from=first, date_to=last)
+    if df.empty: return {}
+    df = df.sort_values('Hora', kind='stable')
+    return {dia: list(zip(g['Hora'], g[other], g['Status'])) for dia, g in df.groupby('Data', sort=False)}
+
+def render_month_grid(year, month, events, hoje):
+    """HTML da grelha completa do mês (um único st.markdown)"""
+    cells = [f"<div class='cal-weekday'>{d}</div>" for d in CAL_WEEKDAYS]
+    for week in calendar.monthcalendar(year, month):
+        for day in week:
+            if day == 0:
+                cells.append("<div class='day-cell empty'></div>"); continue
+            data_atual = datetime(year, month, day).date()
+            past = " past" if data_atual < hoje else ""
+            eventos_html = ""
+            for hora, nome, status in events.get(data_atual, []):
+                nome = html.escape(nome.split()[0]) if nome else "Serviço"
+                eventos_html += f"<div class='event-card{past}' title='{html.escape(status or '')}'>{hora.strftime('%H:%M')} {nome}</div>"
+            current = " current-day" if data_atual == hoje else ""
+            cells.append(f"<div class='day-cell{current}'><span class='day-number'>{day}</span>{eventos_html}</div>")
+    return f"<div class='cal-grid'>{''.join(cells)}</div>"
+
 def page_calendario():
     c_head, c_btn = st.columns([3, 1])
     role = st.session_state['user_role']
     c_head.title("Calendário")
-    df = db.get_user_bookings(st.session_state['user_id'], role)
-    if not df.empty: df['Data'] = pd.to_datetime(df['service_date']).dt.date
-    
-    cal_year = st.session_state['cal_year']
-    cal_month = st.session_state['cal_month']
-    cal = calendar.monthcalendar(cal_year, cal_month)
-    hoje = datetime.now()
 
     cp, cd, cn = st.columns([1, 6, 1])
     if cp.button("←"): 
         st.session_state['cal_month'] -= 1
         if st.session_state['cal_month'] < 1: st.session_state['cal_month']=12; st.session_state['cal_year']-=1
         st.rerun()
-    cd.markdown(f"<h3 style='text-align: center'>{calendar.month_name[cal_month]} {cal_year}</h3>", unsafe_allow_html=True)
     if cn.button("→"):
         st.session_state['cal_month'] += 1
         if st.session_state['cal_month'] > 12: st.session_state['cal_month']=1; st.session_state['cal_year']+=1
         st.rerun()
 
-    cols_header = st.columns(7)
-    for i, d in enumerate(["Dom", "Seg", "Ter", "Qua", "Qui", "Sex", "Sáb"]): cols_header[i].write(f"**{d}**")
+    cal_year = st.session_state['cal_year']
+    cal_month = st.session_state['cal_month']
+    cd.markdown(f"<h3 style='text-align: center'>{calendar.month_name[cal_month]} {cal_year}</h3>", unsafe_allow_html=True)
 
-    for week in cal:
-        cols = st.columns(7)
-        for i, day in enumerate(week):
-            with cols[i]:
-                if day == 0: st.markdown("<div style='min-height: 80px;'></div>", unsafe_allow_html=True)
-                else:
-                    data_atual = datetime(cal_year, cal_month, day).date()
-                    eventos_html = ""
-                    if not df.empty:
-                        eventos_dia = df[df['Data'] == data_atual]
-                        for _, evt in eventos_dia.iterrows():
-                            nome = evt.get('Babysitter') if role == 'Cliente' else evt.get('Cliente')
-                            nome = nome.split()[0] if nome else "Serviço"
-                            eventos_html += f"<div class='event-card'>{nome}</div>"
-                    st.markdown(f"<div class='day-cell'><span class='day-number'>{day}</span>{eventos_html}</div>", unsafe_allow_html=True)
+    # Só as reservas deste mês: o custo não cresce com o histórico do utilizador
+    events = month_events(st.session_state['user_id'], role, cal_year, cal_month)
+    st.markdown(render_month_grid(cal_year, cal_month, events, datetime.now().date()), unsafe_allow_html=True)
 
 # ==============================================================================
 # 8. MENSAGENS (AGORA LIGADO À BASE DE DADOS)
 # ==============================================================================
+CHAT_MAX_BUFFER = 300   # Máximo de mensagens guardadas em memória por conversa
+
+def get_chat_buffer(user_email, other):
+    """
+    Buffer da conversa na sessão: só vai à BD buscar o que é novo (id > last_id).
+    Devolve (buffer, mensagens novas recebidas do outro utilizador).
+    """
+    buffers = st.session_state['chat_buffers']
+    buf = buffers.get(other)
+    novas = []
+    if buf is None or buf['conversation_id'] is None:
+        # Primeira abertura: apenas a página mais recente
+        conv_id = db.get_conversation_id(user_email, other)
+        msgs = db.get_messages_before(conv_id) if conv_id else []
+        buf = {'conversation_id': conv_id, 'msgs': msgs, 'last_id': msgs[-1][0] if msgs else 0,
+               'has_older': len(msgs) == db.CHAT_PAGE_SIZE, 'inbox_version': None}
+        buffers[other] = buf
+    else:
+        # Páginas até vir uma incompleta: nada fica por mostrar se chegarem mais de CHAT_SYNC_LIMIT
+        while True:
+            pagina = db.get_messages_since(buf['conversation_id'], buf['last_id'])
+            if not pagina: break
+            novas.extend(pagina)
+            buf['last_id'] = pagina[-1][0]
+            if len(pagina) < db.CHAT_SYNC_LIMIT: break
+        if novas:
+            buf['msgs'].extend(novas)
+            if len(buf['msgs']) > CHAT_MAX_BUFFER:
+                del buf['msgs'][:len(buf['msgs']) - CHAT_MAX_BUFFER]
+                buf['has_older'] = True
+    return buf, sum(1 for m in novas if m[1] != user_email)
+
+def get_safety_state(buf, user_email):
+    """Estado do filtro de segurança da conversa (iniciado a partir das últimas mensagens enviadas)"""
+    if buf is None: return safety.SafetyState()
+    if 'safety' not in buf:
+        enviadas = [m[2] for m in buf['msgs'] if m[1] == user_email][-3:]
+        buf['safety'] = safety.state_from_history(enviadas)
+    return buf['safety']
+
+@st.fragment(run_every=2)
+def chat_panel(user_email, active):
+    """
+    Só este painel é redesenhado no refresh do chat.
+    A BD só é consultada por mensagens quando a versão da inbox do utilizador muda.
+    """
+    inbox = db.inbox_topic(user_email)
+    version = db.get_versions([inbox])[inbox]
+    buf = st.session_state['chat_buffers'].get(active)
+    if buf is None or buf['inbox_version'] != version:
+        previous = buf['inbox_version'] if buf else None
+        buf, recebidas = get_chat_buffer(user_email, active)
+        if recebidas:
+            db.mark_conversation_read(user_email, active)
+        elif previous is not None:
+            # A mensagem nova é de outra conversa: refrescar a lista de contactos
+            buf['inbox_version'] = version
+            st.rerun(scope="app")
+        buf['inbox_version'] = version
+
+    with st.container(border=True, height=550):
+        st.write(f"**A falar com:** {active}")
+        if buf['has_older']:
+            if st.button("⬆ Carregar mensagens anteriores", key="chat_load_older"):
+                load_older_messages(active); st.rerun(scope="fragment")
+        if not buf['msgs']: st.caption("Inicie a conversa...")
+        
+        for _, sender, content, ts in buf['msgs']:
+            align = "user" if sender == user_email else "assistant"
+            with st.chat_message(align): 
+                st.write(content)
+                # Mostra hora (HH:MM)
+                ts_str = str(ts)
+                hora = ts_str[11:16] if len(ts_str) > 16 else ""
+                st.caption(hora)
+
+def load_older_messages(other):
+    buf = st.session_state['chat_buffers'].get(other)
+    if not buf or not buf['msgs']: return
+    antigas = db.get_messages_before(buf['conversation_id'], buf['msgs'][0][0])
+    buf['msgs'][:0] = antigas
+    buf['has_older'] = len(antigas) == db.CHAT_PAGE_SIZE
+
 def page_mensagens():
     st.header("Mensagens")
     col_contacts, col_chat = st.columns([1, 2.5])
     user_email = st.session_state['user_email']
     
-    contacts = set()
-    if st.session_state['active_chat_user']: 
-        contacts.add(st.session_state['active_chat_user'])
+    # Lista de conversas (uma leitura indexada) + não lidas por conversa
+    conversas = db.get_user_conversations(user_email)
+    unread_by_contact = {other: unread for _, other, unread, _, _ in conversas}
+    contacts = [other for _, other, _, _, _ in conversas]
+    if st.session_state['active_chat_user'] and st.session_state['active_chat_user'] not in unread_by_contact:
+        contacts.insert(0, st.session_state['active_chat_user'])
     
     with col_contacts:
         with st.container(border=True):
             st.subheader("Conversas")
             if not contacts: st.info("Inicie pelo Dashboard.")
             for c in contacts:
-                if st.button(f"📧 {c}", key=c, use_container_width=True): 
+                unread = unread_by_contact.get(c, 0)
+                label = f"📧 {c} ({unread})" if unread else f"📧 {c}"
+                if st.button(label, key=c, use_container_width=True): 
                     st.session_state['active_chat_user'] = c; st.rerun()
 
     with col_chat:
         active = st.session_state['active_chat_user']
-        chat_container = st.container(border=True, height=550)
         
         if active:
-            # LER DA DB
-            historico = db.get_chat_history_db(user_email, active)
+            if unread_by_contact.get(active):
+                db.mark_conversation_read(user_email, active)
             
-            with chat_container:
-                st.write(f"**A falar com:** {active}")
-                if not historico: st.caption("Inicie a conversa...")
-                
-                for sender, content, ts in historico:
-                    align = "user" if sender == user_email else "assistant"
-                    with st.chat_message(align): 
-                        st.write(content)
-                        # Mostra hora (HH:MM)
-                        ts_str = str(ts)
-                        hora = ts_str[11:16] if len(ts_str) > 16 else ""
-                        st.caption(hora)
+            # Painel com refresh próprio (substitui o time.sleep(2) + rerun da página inteira)
+            chat_panel(user_email, active)
 
             # ENVIAR
             if prompt := st.chat_input("Escreva aqui..."):
-                safe, err = check_safety_rules(prompt, "")
+                buf = st.session_state['chat_buffers'].get(active)
+                estado = get_safety_state(buf, user_email)
+                safe, err = safety.check_message(prompt, estado)
                 if safe:
                     db.send_message_db(user_email, active, prompt)
+                    # Forçar a sincronização do buffer para mostrar já a mensagem enviada
+                    if buf: buf['inbox_version'] = None
                     st.rerun()
                 else: st.error(err)
-            
-            # --- CORREÇÃO: AUTO-REFRESH DO CHAT ---
-            # Isto faz o chat atualizar sozinho a cada 2 segundos
-            time.sleep(2)
-            st.rerun()
 
         else:
-            with chat_container:
+            with st.container(border=True, height=550):
                 st.markdown("<div style='text-align:center;margin-top:100px;color:#ccc'><h3>Selecione uma conversa</h3></div>", unsafe_allow_html=True)
 def page_editar_perfil():
     st.header("⚙️ Configurações de Perfil")
+    perfil = db.get_user_profile(st.session_state['user_id']) or {}
     c1, c2 = st.columns(2)
-    with c1: st.text_input("Nome", value=st.session_state['user_name']); st.text_input("Email", value=st.session_state['user_email'], disabled=True)
-    with c2: st.text_input("Telefone", "+351 ..."); st.button("Guardar Alterações")
+    with c1: nome = st.text_input("Nome", value=st.session_state['user_name']); st.text_input("Email", value=st.session_state['user_email'], disabled=True)
+    with c2:
+        telefone = st.text_input("Telefone", value=perfil.get('phone') or "", placeholder="+351 ...")
+        if st.button("Guardar Alterações"):
+            if db.update_user_profile(st.session_state['user_id'], name=nome, phone=telefone):
+                st.session_state['user_name'] = nome
+                st.success("Perfil atualizado!")
+            else: st.error("Não foi possível guardar o perfil.")
 
 # ==============================================================================
 # 9. ROUTER
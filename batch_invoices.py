@@ -0,0 +1,140 @@
+import argparse
+import os
+import sys
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+
+from db_config import DB_NAME, connect
+from invoices import BILLED_FIELDS, BILLING_SELECT, create_pdf_invoice
+
+# ==============================================================================
+# FATURAÇÃO EM LOTE (FIM DO MÊS)
+# ==============================================================================
+# Uso:
+#   python batch_invoices.py 2025-11                     -> faturas/2025-11/fatura_<id>.pdf
+#   python batch_invoices.py 2025-11 --zip faturas.zip   -> um único zip
+#   python batch_invoices.py 2025-11-01 2025-11-15 --db outra.db --workers 4
+#   python batch_invoices.py 2025-10 2025-11-15          -> de 1 de outubro a 15 de novembro
+#
+# As reservas concluídas do período são lidas em blocos (fetchmany), sem carregar
+# tudo em memória; cada bloco é gerado em paralelo num ProcessPoolExecutor
+# (o FPDF é CPU puro) e escrito antes de ler o bloco seguinte.
+
+CHUNK_SIZE = 200
+
+_PERIOD_SQL = BILLING_SELECT + """
+    WHERE b.status = 'Concluído' AND b.service_date BETWEEN ? AND ?
+    ORDER BY b.service_date, b.id
+"""
+
+
+def _day_bounds(text):
+    """'2025-11' -> (1 e último dia do mês); '2025-11-15' -> (esse dia, esse dia)"""
+    if len(text) == 7:
+        year, month = map(int, text.split('-'))
+        first = date(year, month, 1)
+        return first, date.fromordinal(date(year + (month == 12), month % 12 + 1, 1).toordinal() - 1)
+    day = date.fromisoformat(text)
+    return day, day
+
+
+def period_bounds(start, end=None):
+    """
+    '2025-11' -> ('2025-11-01', '2025-11-30'); duas datas -> intervalo inclusivo.
+    start e end aceitam um mês (AAAA-MM) ou um dia (AAAA-MM-DD). ValueError se forem inválidos.
+    """
+    first, last = _day_bounds(start)
+    if end is not None:
+        last = _day_bounds(end)[1]
+    if first > last:
+        raise ValueError(f"o período acaba ({last}) antes de começar ({first})")
+    return first.isoformat(), last.isoformat()
+
+
+def iter_completed_chunks(conn, first_day, last_day, chunk_size=CHUNK_SIZE):
+    """Blocos de dicts (campos faturados) das reservas concluídas no período"""
+    cur = conn.execute(_PERIOD_SQL, (first_day, last_day))
+    while True:
+        rows = cur.fetchmany(chunk_size)
+        if not rows:
+            return
+        yield [dict(zip(BILLED_FIELDS, row)) for row in rows]
+
+
+def _render(billing):
+    # Corre no processo filho
+    return billing['id'], create_pdf_invoice(billing)
+
+
+class _DirWriter:
+    def __init__(self, path):
+        self.path = path
+
+    def write(self, name, data):
+        os.makedirs(self.path, exist_ok=True)
+        with open(os.path.join(self.path, name), 'wb') as f:
+            f.write(data)
+
+    def close(self):
+        pass
+
+
+class _ZipWriter:
+    def __init__(self, path):
+        self.zip = zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_DEFLATED)
+
+    def write(self, name, data):
+        self.zip.writestr(name, data)
+
+    def close(self):
+        self.zip.close()
+
+
+def run_batch(db_name, first_day, last_day, out_dir=None, zip_path=None, workers=None, chunk_size=CHUNK_SIZE):
+    """Gera as faturas do período. Devolve {'invoices', 'bytes', 'seconds'}."""
+    workers = workers or os.cpu_count() or 1
+    per_worker = max(1, chunk_size // (4 * workers))   # vários pedaços por processo e por bloco
+    writer = _ZipWriter(zip_path) if zip_path else _DirWriter(out_dir)
+    conn = connect(db_name)
+    total = size = 0
+    start = time.perf_counter()
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for chunk in iter_completed_chunks(conn, first_day, last_day, chunk_size):
+                for booking_id, pdf_bytes in pool.map(_render, chunk, chunksize=per_worker):
+                    writer.write(f"fatura_{booking_id}.pdf", pdf_bytes)
+                    total += 1
+                    size += len(pdf_bytes)
+    finally:
+        conn.close()
+        writer.close()
+    return {'invoices': total, 'bytes': size, 'seconds': time.perf_counter() - start}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Faturas PDF de todas as reservas concluídas num período")
+    parser.add_argument('start', help="Mês (AAAA-MM) ou primeiro dia (AAAA-MM-DD)")
+    parser.add_argument('end', nargs='?', help="Último mês (AAAA-MM) ou dia (AAAA-MM-DD), inclusivo")
+    parser.add_argument('--db', default=DB_NAME)
+    parser.add_argument('--out', help="Pasta de destino (por omissão faturas/<período>)")
+    parser.add_argument('--zip', help="Escrever um único ficheiro zip em vez de uma pasta")
+    parser.add_argument('--workers', type=int, default=None, help="Processos (por omissão nº de CPUs)")
+    parser.add_argument('--chunk', type=int, default=CHUNK_SIZE, help="Reservas lidas por bloco")
+    args = parser.parse_args()
+
+    try:
+        first_day, last_day = period_bounds(args.start, args.end)
+    except ValueError as e:
+        parser.error(f"período inválido: {e}")
+    out_dir = args.out or os.path.join('faturas', args.start if args.end is None else f"{first_day}_{last_day}")
+    result = run_batch(args.db, first_day, last_day, out_dir=out_dir, zip_path=args.zip,
+                       workers=args.workers, chunk_size=args.chunk)
+
+    if result['invoices'] == 0:
+        print(f"Nenhuma reserva concluída entre {first_day} e {last_day}.")
+        sys.exit(0)
+    rate = result['invoices'] / result['seconds'] if result['seconds'] else float('inf')
+    print(f"✅ {result['invoices']} fatura(s) ({result['bytes'] / 1024:.0f} KB) em {result['seconds']:.1f}s "
+          f"-> {rate:.0f} faturas/s | destino: {args.zip or out_dir}")
@@ -0,0 +1,68 @@
+import sys
+import time
+
+import pandas as pd
+
+import db_manager as db
+
+# ==============================================================================
+# BENCHMARK: LEITURA DE UMA LINHA (PANDAS vs LINHA TIPADA)
+# ==============================================================================
+# Uso: python bench_rows.py [ficheiro.db] [repetições]
+# Compara o caminho antigo (read_sql_query + iloc[0].to_dict() + pd.to_datetime)
+# com db.get_upcoming_or_active_booking (dataclass + conversores do sqlite3).
+
+_LEGACY_SQL = """
+    SELECT b.*, u.name as BabysitterName, u.email as BabysitterEmail, u.price_per_hour, u.photo_url as BabysitterPhoto
+    FROM bookings b
+    JOIN users u ON b.babysitter_id = u.id
+    WHERE b.client_id = ?
+    AND b.status IN ('Confirmado', 'Em Curso')
+    ORDER BY b.service_date ASC, b.start_time ASC LIMIT 1
+"""
+
+
+def legacy_upcoming_booking(user_id):
+    """Implementação anterior (DataFrame só para obter uma linha)"""
+    conn = db.get_connection()
+    try:
+        df = pd.read_sql_query(_LEGACY_SQL, conn, params=(user_id,))
+        if not df.empty:
+            row = df.iloc[0].to_dict()
+            row['Data'] = pd.to_datetime(row['service_date']).date()
+            row['Hora'] = pd.to_datetime(row['start_time'], format='%H:%M').time()
+            if row['check_in_time']:
+                row['check_in_time'] = pd.to_datetime(row['check_in_time'])
+            return row
+        return None
+    finally:
+        conn.close()
+
+
+def bench(label, fn, repeat):
+    fn()   # aquecimento (pool, cache de statements)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    per_call = (time.perf_counter() - start) / repeat * 1e6
+    print(f"{label:<28} {per_call:10.1f} µs/chamada")
+    return per_call
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        db.configure_pool(db_name=sys.argv[1])
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+
+    conn = db.get_connection()
+    try:
+        row = conn.execute("SELECT client_id FROM bookings WHERE status IN ('Confirmado', 'Em Curso') LIMIT 1").fetchone()
+    finally:
+        conn.close()
+    if row is None:
+        sys.exit("Sem reservas ativas nesta base de dados (nada para medir).")
+    client_id = row[0]
+
+    before = bench("pandas (anterior)", lambda: legacy_upcoming_booking(client_id), repeat)
+    after = bench("linha tipada", lambda: db.get_upcoming_or_active_booking(client_id, 'Cliente'), repeat)
+    print(f"Ganho: {before / after:.1f}x")
@@ -0,0 +1,109 @@
+import random
+import re
+import sys
+import time
+
+import safety
+
+# ==============================================================================
+# BENCHMARK: FILTRO DE SEGURANÇA DO CHAT
+# ==============================================================================
+# Uso: python bench_safety.py [nº de mensagens por conversa] [semente]
+# Compara, mensagem a mensagem numa conversa longa:
+#   - anterior: check_safety_rules(texto, histórico completo concatenado)
+#   - safety.check_message(texto, estado) (custo só da mensagem)
+# e mede também o custo por mensagem isolada (sem histórico).
+
+FRASES = [
+    "Olá! Tudo bem? Amanhã chego às {h}:{m:02d}.",
+    "O {nome} tem {idade} anos e deita-se às {h}h.",
+    "Combinado, ficam {n} horas então.",
+    "Pode trazer o lanche? Ele come por volta das {h}:{m:02d}.",
+    "A morada é Rua {nome} nº{n}, {andar}º esquerdo.",
+    "Obrigada! Correu tudo muito bem hoje 😊",
+    "Dia {d}/{mes}/2025 está disponível?",
+    "O preço fica em {n}€ por hora, certo?",
+    "Ele tem alergia a frutos secos, por favor tenha atenção.",
+    "Chegámos a casa, pode sair às {h}:{m:02d}.",
+]
+NOMES = ["Tomás", "Inês", "Martim", "Leonor", "Santiago", "Matilde"]
+# ~2% das mensagens tentam partilhar contactos (inteiros ou partidos em duas mensagens)
+VIOLACOES = [
+    ["Liga-me para o 912 345 678"],
+    ["O meu email é ana.silva@gmail.com"],
+    ["o meu número é 93 12", "3 45 67"],
+    ["escreve para joao.m", "@sapo.pt"],
+]
+VIOLATION_RATE = 0.02
+
+# Versão anterior (app.py) para comparação
+def legacy_check(text, history_context=""):
+    full_text = history_context + " " + text
+    if re.search(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b', full_text):
+        return False, "Proibido partilhar emails."
+    digits_only = re.sub(r'\D', '', full_text)
+    if len(digits_only) >= 9:
+        if digits_only[0] in ['9', '2', '3']:
+             return False, "Proibido partilhar contactos telefónicos."
+    return True, ""
+
+
+def make_corpus(n, rng):
+    msgs = []
+    while len(msgs) < n:
+        if rng.random() < VIOLATION_RATE:
+            msgs.extend(rng.choice(VIOLACOES)); continue
+        msgs.append(rng.choice(FRASES).format(
+            h=rng.randint(7, 22), m=rng.choice([0, 15, 30, 45]), nome=rng.choice(NOMES),
+            idade=rng.randint(1, 10), n=rng.randint(2, 40), andar=rng.randint(1, 8),
+            d=rng.randint(1, 28), mes=rng.randint(1, 12)))
+    return msgs[:n]
+
+
+def bench(label, fn, msgs):
+    start = time.perf_counter()
+    blocked = fn(msgs)
+    per_msg = (time.perf_counter() - start) / len(msgs) * 1e6
+    print(f"{label:<44} {per_msg:10.1f} µs/mensagem  (bloqueadas: {blocked})")
+    return per_msg
+
+
+def run_legacy_history(msgs):
+    history, blocked = "", 0
+    for text in msgs:
+        ok, _ = legacy_check(text, history)
+        if ok: history += " " + text
+        else: blocked += 1
+    return blocked
+
+def run_legacy_isolated(msgs):
+    return sum(not legacy_check(text)[0] for text in msgs)
+
+def run_streaming(msgs):
+    state, blocked = safety.SafetyState(), 0
+    for text in msgs:
+        ok, _ = safety.check_message(text, state)
+        blocked += not ok
+    return blocked
+
+def run_isolated(msgs):
+    return sum(not safety.check_safety_rules(text)[0] for text in msgs)
+
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    rng = random.Random(int(sys.argv[2]) if len(sys.argv) > 2 else 42)
+    msgs = make_corpus(n, rng)
+    print(f"Conversa com {n} mensagens (média {sum(map(len, msgs)) / n:.0f} caracteres)\n")
+
+    bench("anterior, sem histórico", run_legacy_isolated, msgs)
+    bench("safety.check_safety_rules, sem histórico", run_isolated, msgs)
+    # Com histórico, a versão anterior volta a analisar a conversa toda a cada mensagem
+    # (e junta todos os dígitos do histórico): o custo cresce com o tamanho da conversa.
+    bench("anterior, histórico concatenado", run_legacy_history, msgs)
+    bench("safety.check_message (estado incremental)", run_streaming, msgs)
+
+    # Número partido em várias mensagens continua a ser detetado
+    state = safety.SafetyState()
+    results = [safety.check_message(m, state)[0] for m in ["o meu número é 912", "345", "678"]]
+    print(f"\nNúmero partido em 3 mensagens: {'detetado' if results == [True, True, False] else 'NÃO detetado'}")
@@ -0,0 +1,74 @@
+import random
+import sqlite3
+import time
+
+DB_NAME = 'babyconnect.db'
+
+# --- CONFIGURAÇÃO DO ARMAZENAMENTO SQLITE ---
+# WAL permite leituras (chat, dashboards) em paralelo com uma escrita.
+# synchronous=NORMAL é seguro em WAL (só se perde a última transação num corte de energia).
+
+BUSY_TIMEOUT_MS = 5000
+
+PRAGMAS = [
+    ('journal_mode', 'WAL'),
+    ('synchronous', 'NORMAL'),
+    ('cache_size', -20000),       # ~20 MB de cache de páginas
+    ('mmap_size', 268435456),     # 256 MB mapeados em memória
+    ('temp_store', 'MEMORY'),
+    ('busy_timeout', BUSY_TIMEOUT_MS),
+    ('foreign_keys', 'ON'),
+]
+
+# Retry das escritas quando a BD está bloqueada por outro writer
+WRITE_RETRIES = 5
+WRITE_BACKOFF_BASE = 0.05   # segundos
+WRITE_BACKOFF_MAX = 1.0
+
+
+def apply_storage_config(conn):
+    """Aplica os PRAGMAs a uma ligação nova (usado pelo pool e pelo db_setup)"""
+    for name, value in PRAGMAS:
+        conn.execute(f"PRAGMA {name} = {value}")
+    return conn
+
+
+def connect(db_name, **kwargs):
+    """sqlite3.connect com a configuração de armazenamento já aplicada"""
+    kwargs.setdefault('timeout', BUSY_TIMEOUT_MS / 1000)
+    return apply_storage_config(sqlite3.connect(db_name, **kwargs))
+
+
+def is_locked_error(exc):
+    msg = str(exc).lower()
+    return isinstance(exc, sqlite3.OperationalError) and ('locked' in msg or 'busy' in msg)
+
+
+def run_write(conn, fn, retries=WRITE_RETRIES):
+    """
+    Executa fn(conn) numa transação BEGIN IMMEDIATE e faz commit.
+    Se a BD estiver bloqueada, faz rollback e tenta de novo com backoff exponencial.
+    Dentro de uma transação já aberta apenas executa fn (quem abriu faz o commit).
+    """
+    if conn.in_transaction:
+        return fn(conn)
+
+    attempt = 0
+    while True:
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            result = fn(conn)
+            conn.commit()
+            return result
+        except sqlite3.OperationalError as e:
+            if conn.in_transaction:
+                conn.rollback()
+            if not is_locked_error(e) or attempt >= retries:
+                raise
+            delay = min(WRITE_BACKOFF_MAX, WRITE_BACKOFF_BASE * (2 ** attempt))
+            time.sleep(delay * (0.5 + random.random() / 2))
+            attempt += 1
+        except Exception:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
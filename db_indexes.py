@@ -0,0 +1,75 @@
+import re
+import sys
+
+# --- ÍNDICES SECUNDÁRIOS ---
+# Um índice por cada query "quente" do db_manager (chamadas em todos os reruns).
+# (nome, tabela, colunas). Quem os cria são as migrações, cada uma com o seu CREATE INDEX
+# escrito por extenso: este catálogo serve só para missing_indexes() detetar esquemas incompletos.
+INDEXES = [
+    # Histórico / chat incremental por conversa
+    ('idx_messages_conversation_id', 'messages', ('conversation_id', 'id')),
+    # get_user_conversations (um lado de cada UNION ALL)
+    ('idx_conversations_user_a', 'conversations', ('user_a', 'last_message_at')),
+    ('idx_conversations_user_b', 'conversations', ('user_b', 'last_message_at')),
+    # Disponibilidade: reservas da babysitter que acabam depois do início pedido
+    ('idx_bookings_sitter_interval', 'bookings', ('babysitter_id', 'end_ts', 'start_ts', 'status')),
+    # list_babysitters_page: ordenação por avaliação / preço sem sort em memória (e get_all_babysitters)
+    ('idx_users_role_rating', 'users', ('role', 'coalesce(rating, 5.0) DESC', 'id')),
+    ('idx_users_role_price', 'users', ('role', 'coalesce(price_per_hour, 10.0)', 'id')),
+    # find_nearest_babysitters: células da grelha geoespacial
+    ('idx_users_role_cell', 'users', ('role', 'geo_cell')),
+    # get_user_bookings / get_upcoming_or_active_booking: participante + datas, ORDER BY sem sort em memória
+    ('idx_bookings_client_date', 'bookings', ('client_id', 'service_date', 'start_time')),
+    ('idx_bookings_sitter_date', 'bookings', ('babysitter_id', 'service_date', 'start_time')),
+    # daily_booking_summary: reservas de um dia (atualização a cada escrita)
+    ('idx_bookings_date_status', 'bookings', ('service_date', 'status', 'total_price')),
+    # get_active_services(): serviços em curso pela hora prevista de fim
+    ('idx_bookings_status_end', 'bookings', ('status', 'scheduled_end')),
+    # get_booking_events_since(booking_id=...)
+    ('idx_booking_events_booking_seq', 'booking_events', ('booking_id', 'seq')),
+]
+
+
+def missing_indexes(conn):
+    """Índices do catálogo que não existem nesta base de dados"""
+    existing = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='index'")}
+    return [name for name, _, _ in INDEXES if name not in existing]
+
+
+# --- PLANOS DE EXECUÇÃO ---
+# As queries verificadas são as que o db_manager executa de facto (capturadas com
+# set_trace_callback em tests/test_query_plans.py), nunca cópias do SQL.
+PLAN_TABLES = ('bookings', 'messages', 'users')
+
+_TABLE_REF_RE = re.compile(
+    r'\b(?:FROM|JOIN)\s+(\w+)(?:\s+(?:AS\s+)?(?!(?:WHERE|JOIN|ON|LEFT|INNER|CROSS|GROUP|ORDER|LIMIT|UNION|USING)\b)(\w+))?',
+    re.IGNORECASE)
+_SCAN_RE = re.compile(r'SCAN (\w+)')
+
+
+def table_scans(conn, sql, tables=PLAN_TABLES):
+    """Linhas SCAN do plano de 'sql' (SQL já com os valores) sobre as tabelas indicadas"""
+    aliases = {}
+    for table, alias in _TABLE_REF_RE.findall(sql):
+        aliases[table.lower()] = table.lower()
+        if alias:
+            aliases[alias.lower()] = table.lower()
+    scans = []
+    for *_, detail in conn.execute(f"EXPLAIN QUERY PLAN {sql}"):
+        match = _SCAN_RE.match(detail)
+        if match and aliases.get(match.group(1).lower(), match.group(1).lower()) in tables:
+            scans.append(detail)
+    return scans
+
+
+if __name__ == '__main__':
+    # Uso: python db_indexes.py [ficheiro.db]  -> sai com código 1 se faltar algum índice
+    # (os planos das queries são verificados por tests/test_query_plans.py)
+    from db_config import DB_NAME, connect
+    conn = connect(sys.argv[1] if len(sys.argv) > 1 else DB_NAME)
+    missing = missing_indexes(conn)
+    conn.close()
+    if missing:
+        print(f"⚠️ Índices em falta (correr migrations.py): {', '.join(missing)}")
+        sys.exit(1)
+    print("✅ Todos os índices do catálogo existem.")
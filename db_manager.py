@@ -1,41 +1,384 @@
-import sqlite3
+import json
+import threading
 import pandas as pd
-from datetime import datetime
+from datetime import datetime, timedelta
 
-DB_NAME = 'babyconnect.db'
+import db_config
+import geo_index
+from db_rows import DETECT_TYPES, ActiveBooking, ActiveService, UserProfile, fetch_all, fetch_one
+from db_config import apply_storage_config, run_write
+from db_pool import ConnectionPool
+from migrations import migrate
+from query_cache import QueryCache, cached
+
+DB_NAME = db_config.DB_NAME
+POOL_SIZE = 8
+
+# --- LIGAÇÕES (POOL) ---
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def _setup_connection(conn):
+    """Corre uma única vez por ligação, quando é aberta pelo pool"""
+    apply_storage_config(conn)
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                pool = ConnectionPool(DB_NAME, max_size=POOL_SIZE, on_connect=_setup_connection,
+                                      detect_types=DETECT_TYPES)
+                # Migrações no arranque: uma leitura de user_version se o esquema já estiver atualizado
+                conn = pool.acquire()
+                try:
+                    migrate(conn)
+                finally:
+                    conn.close()
+                _pool = pool
+    return _pool
+
+def configure_pool(db_name=None, max_size=None):
+    """Troca a base de dados e/ou o tamanho do pool (fecha as ligações livres atuais)"""
+    global _pool, DB_NAME, POOL_SIZE
+    with _pool_lock:
+        if db_name is not None: DB_NAME = db_name
+        if max_size is not None: POOL_SIZE = max_size
+        old, _pool = _pool, None
+    if old is not None:
+        old.close_all()
+    _cache.clear()
 
 def get_connection():
-    return sqlite3.connect(DB_NAME)
+    # conn.close() devolve a ligação ao pool em vez de a fechar
+    return _get_pool().acquire()
+
+def get_pool_stats():
+    """Contadores do pool (opens, checkouts, reuses, waits...) para monitorização"""
+    return _get_pool().stats()
+
+# --- CACHE DE DADOS DE REFERÊNCIA ---
+# Perfis, preços e listagens de babysitters mudam pouco mas são relidos a cada rerun.
+# Tags: 'users' (perfis) e 'bookings' (disponibilidade). Quem escreve chama _cache.invalidate(tag)
+# depois do commit; o TTL só limita alterações feitas fora deste processo.
+REFERENCE_TTL = 300
+
+_cache = QueryCache(maxsize=512, default_ttl=REFERENCE_TTL)
+
+def get_cache_stats():
+    """Contadores da cache (hits, misses, hit_rate...) para monitorização"""
+    return _cache.stats()
+
+# --- CHANGE FEED (VERSÕES POR TÓPICO) ---
+# Cada escrita incrementa, na mesma transação, a versão dos tópicos que afeta.
+# As páginas guardam as versões que já mostraram e só refrescam quando mudam.
+
+def user_bookings_topic(user_id): return f"bookings:user:{user_id}"
+def booking_topic(booking_id): return f"booking:{booking_id}"
+def conversation_topic(conversation_id): return f"conversation:{conversation_id}"
+def inbox_topic(email): return f"inbox:{email}"
+
+def bump_versions(c, *topics):
+    c.executemany("""
+        INSERT INTO change_versions (topic, version, updated_at) VALUES (?, 1, CURRENT_TIMESTAMP)
+        ON CONFLICT (topic) DO UPDATE SET version = version + 1, updated_at = excluded.updated_at
+    """, [(t,) for t in topics])
+
+# --- LOG DE EVENTOS DAS RESERVAS ---
+# Append-only, escrito na mesma transação que a alteração da reserva.
+# seq é monótono: "há novidades desde N?" = uma procura por chave primária.
+
+# Eventos que mudam o estado, o preço ou a duração da reserva (os outros não mexem no resumo)
+SUMMARY_EVENTS = {'created', 'extension_accepted', 'extended', 'started', 'finished'}
+
+def _record_booking_event(c, booking_id, event_type, **payload):
+    c.execute("INSERT INTO booking_events (booking_id, event_type, payload) VALUES (?, ?, ?)",
+              (booking_id, event_type, json.dumps(payload, default=str) if payload else None))
+    row = c.execute("SELECT client_id, babysitter_id, service_date FROM bookings WHERE id=?", (booking_id,)).fetchone()
+    if row:
+        client_id, babysitter_id, day = row
+        # Tópicos de uma reserva: a própria + as listas do cliente e da babysitter
+        bump_versions(c, booking_topic(booking_id), user_bookings_topic(client_id), user_bookings_topic(babysitter_id))
+        if event_type in SUMMARY_EVENTS:
+            _update_daily_summary(c, babysitter_id, day)
+
+def get_booking_events_since(after_seq=0, booking_id=None, limit=500):
+    """Eventos com seq > after_seq (opcionalmente só de uma reserva), por ordem"""
+    conn = get_connection()
+    try:
+        if booking_id is None:
+            rows = conn.execute("""
+                SELECT seq, booking_id, event_type, payload, created_at FROM booking_events
+                WHERE seq > ? ORDER BY seq ASC LIMIT ?
+            """, (after_seq, limit)).fetchall()
+        else:
+            rows = conn.execute("""
+                SELECT seq, booking_id, event_type, payload, created_at FROM booking_events
+                WHERE booking_id = ? AND seq > ? ORDER BY seq ASC LIMIT ?
+            """, (booking_id, after_seq, limit)).fetchall()
+        return [{'seq': seq, 'booking_id': b_id, 'event_type': et,
+                 'payload': json.loads(p) if p else {}, 'created_at': ts}
+                for seq, b_id, et, p, ts in rows]
+    finally:
+        conn.close()
+
+# --- RESUMO DIÁRIO (PAINEL ADMIN) ---
+# daily_booking_summary = (dia, babysitter, status) -> reservas, receita, minutos reservados e
+# minutos de extensão. Mantido na escrita: cada evento de SUMMARY_EVENTS recalcula, na mesma
+# transação, as linhas do dia e da babysitter dessa reserva (procura indexada, não lê o histórico).
+
+_SUMMARY_INSERT = """
+    INSERT INTO daily_booking_summary
+        (day, babysitter_id, status, bookings, revenue, booked_minutes, extension_minutes)
+    SELECT service_date, babysitter_id, status, count(*), coalesce(sum(total_price), 0),
+           coalesce(sum(duration * 60), 0), coalesce(sum(extension_minutes), 0)
+    FROM bookings {where}
+    GROUP BY service_date, babysitter_id, status
+"""
+
+def _update_daily_summary(c, babysitter_id, day):
+    c.execute("DELETE FROM daily_booking_summary WHERE day = ? AND babysitter_id = ?", (day, babysitter_id))
+    c.execute(_SUMMARY_INSERT.format(where="WHERE babysitter_id = ? AND service_date = ?"), (babysitter_id, day))
+
+def rebuild_daily_summary():
+    """Refaz o resumo a partir de todas as reservas (ex: depois de alterações feitas diretamente
+    na tabela bookings). Devolve o nº de linhas do resumo."""
+    conn = get_connection()
+    def _write(c):
+        c.execute("DELETE FROM daily_booking_summary")
+        c.execute(_SUMMARY_INSERT.format(where=""))
+        return c.execute("SELECT count(*) FROM daily_booking_summary").fetchone()[0]
+    try:
+        return run_write(conn, _write)
+    finally:
+        conn.close()
+
+def get_versions(topics):
+    """{tópico: versão} numa única leitura (tópicos nunca escritos ficam com 0)"""
+    topics = list(topics)
+    if not topics:
+        return {}
+    conn = get_connection()
+    try:
+        marks = ', '.join('?' * len(topics))
+        rows = conn.execute(f"SELECT topic, version FROM change_versions WHERE topic IN ({marks})", topics).fetchall()
+        versions = dict.fromkeys(topics, 0)
+        versions.update(rows)
+        return versions
+    finally:
+        conn.close()
 
 # --- UTILIZADORES ---
+BABYSITTER_COLUMNS = "id, name as Nome, rating as Avaliação, price_per_hour as 'Preço/Hora', location as Localização, bio as Bio, photo_url as Foto, latitude, longitude"
 
 def verify_login(email, password):
+    # Sempre verificada na BD: nenhuma credencial (nem hash) fica na cache
+    conn = get_connection()
+    try:
+        user = conn.execute("SELECT id, name, role, email, location FROM users WHERE email=? AND password=?",
+                            (email, password)).fetchone()
+    finally:
+        conn.close()
+    if user:
+        return {'id': user[0], 'name': user[1], 'role': user[2], 'email': user[3], 'location': user[4]}
+    return None
+
+@cached(_cache, tags=('users',))
+def get_user_profile(user_id):
+    conn = get_connection()
+    try:
+        return fetch_one(conn, UserProfile, "SELECT id, name, email, phone, location, bio, price_per_hour FROM users WHERE id=?", (user_id,))
+    finally:
+        conn.close()
+
+@cached(_cache, tags=('users',))
+def get_babysitter_price(babysitter_id, default=10.0):
     conn = get_connection()
-    c = conn.cursor()
     try:
-        # Query parametrizada (Segura)
-        c.execute("SELECT id, name, role, email, location FROM users WHERE email=? AND password=?", (email, password))
-        user = c.fetchone()
-        if user:
-            return {'id': user[0], 'name': user[1], 'role': user[2], 'email': user[3], 'location': user[4]}
-        return None
+        row = conn.execute("SELECT price_per_hour FROM users WHERE id=?", (babysitter_id,)).fetchone()
     finally:
         conn.close()
+    return row[0] if row and row[0] is not None else default
 
-def get_all_babysitters():
+PROFILE_FIELDS = ('name', 'phone', 'location', 'bio', 'price_per_hour')
+
+def update_user_profile(user_id, **fields):
+    """Atualiza os campos de PROFILE_FIELDS indicados (os restantes ficam iguais)"""
+    fields = {k: v for k, v in fields.items() if k in PROFILE_FIELDS}
+    if not fields:
+        return False
+    conn = get_connection()
+    try:
+        assignments = ', '.join(f"{k}=?" for k in fields)
+        run_write(conn, lambda c: c.execute(f"UPDATE users SET {assignments} WHERE id=?", (*fields.values(), user_id)))
+        _cache.invalidate('users')
+        return True
+    except Exception as e:
+        print(f"❌ Erro SQL: {e}")
+        return False
+    finally:
+        conn.close()
+
+@cached(_cache, tags=('users', 'bookings'))
+def get_all_babysitters(available_for=None):
+    """available_for=(início, fim) -> só babysitters sem reservas sobrepostas nesse intervalo"""
     conn = get_connection()
     try:
         # Pandas lê SQL diretamente
-        query = "SELECT id, name as Nome, rating as Avaliação, price_per_hour as 'Preço/Hora', location as Localização, bio as Bio, photo_url as Foto FROM users WHERE role='Babysitter'"
-        return pd.read_sql_query(query, conn)
+        query = f"SELECT {BABYSITTER_COLUMNS} FROM users WHERE role='Babysitter'"
+        params = ()
+        if available_for:
+            query += f" AND {_AVAILABLE_SQL}"
+            params = tuple(available_for)
+        return pd.read_sql_query(query, conn, params=params)
     finally:
         conn.close()
 
+# --- LISTAGEM PAGINADA (KEYSET) ---
+# rating / price_per_hour podem ser NULL: a listagem usa o valor por omissão das colunas
+# (o mesmo que o cálculo do preço), com a mesma expressão dos índices idx_users_role_rating/price.
+LISTING_RATING = "coalesce(rating, 5.0)"
+LISTING_PRICE = "coalesce(price_per_hour, 10.0)"
+# Só as colunas que o cartão do passo 2 mostra; a bio vem truncada.
+LISTING_COLUMNS = f"id, name as Nome, {LISTING_RATING} as Avaliação, {LISTING_PRICE} as 'Preço/Hora', location as Localização, substr(bio, 1, 160) as Bio, photo_url as Foto, latitude, longitude"
+LISTING_PAGE_SIZE = 10
+
+# sort -> (expressão, direção). Desempate sempre por id ASC.
+LISTING_SORTS = {
+    'rating': (LISTING_RATING, 'DESC'),
+    'price': (LISTING_PRICE, 'ASC'),
+}
+
+@cached(_cache, tags=('users', 'bookings'))
+def list_babysitters_page(sort='rating', after=None, limit=LISTING_PAGE_SIZE, location=None,
+                          min_price=None, max_price=None, min_rating=None, available_for=None):
+    """
+    Uma página de babysitters filtrada e ordenada no SQL.
+    after = cursor devolvido pela página anterior (valor da ordenação, id).
+    Devolve (DataFrame, próximo cursor ou None se não houver mais).
+    """
+    column, direction = LISTING_SORTS[sort]
+    where = ["role = 'Babysitter'"]
+    params = []
+    if location:
+        where.append("location = ? COLLATE NOCASE"); params.append(location)
+    if min_price is not None:
+        where.append(f"{LISTING_PRICE} >= ?"); params.append(min_price)
+    if max_price is not None:
+        where.append(f"{LISTING_PRICE} <= ?"); params.append(max_price)
+    if min_rating is not None:
+        where.append(f"{LISTING_RATING} >= ?"); params.append(min_rating)
+    if available_for:
+        where.append(_AVAILABLE_SQL); params.extend(available_for)
+    if after is not None:
+        op = '<' if direction == 'DESC' else '>'
+        where.append(f"({column} {op} ? OR ({column} = ? AND id > ?))")
+        params.extend([after[0], after[0], after[1]])
+
+    query = f"""
+        SELECT {LISTING_COLUMNS} FROM users 
+        WHERE {' AND '.join(where)}
+        ORDER BY {column} {direction}, id ASC LIMIT ?
+    """
+    params.append(limit + 1)   # +1 para saber se há página seguinte
+    conn = get_connection()
+    try:
+        df = pd.read_sql_query(query, conn, params=params)
+    finally:
+        conn.close()
+
+    if len(df) <= limit:
+        return df, None
+    df = df.iloc[:limit]
+    sort_col = {'rating': 'Avaliação', 'price': 'Preço/Hora'}[sort]
+    last = df.iloc[-1]
+    return df, (float(last[sort_col]), int(last['id']))
+
+# --- DISPONIBILIDADE ---
+# Cada reserva guarda o intervalo [start_ts, end_ts) ('YYYY-MM-DD HH:MM:SS', comparável como texto).
+# end_ts inclui as extensões aceites. Sobreposição: existente.end > novo.início AND existente.início < novo.fim
+
+ACTIVE_STATUSES = ('Confirmado', 'Em Curso')
+
+_AVAILABLE_SQL = """NOT EXISTS (
+    SELECT 1 FROM bookings b 
+    WHERE b.babysitter_id = users.id AND b.end_ts > ? AND b.start_ts < ?
+      AND b.status IN ('Confirmado', 'Em Curso'))"""
+
+class BookingConflictError(Exception):
+    """A babysitter já tem uma reserva ativa que se sobrepõe ao horário pedido"""
+
+def booking_interval(data, hora, duracao_horas, extension_minutes=0):
+    """(início, fim) em texto a partir dos campos do formulário"""
+    start = datetime.combine(data, hora).replace(second=0, microsecond=0)
+    end = start + timedelta(hours=duracao_horas, minutes=extension_minutes)
+    return start.strftime('%Y-%m-%d %H:%M:%S'), end.strftime('%Y-%m-%d %H:%M:%S')
+
+def _has_conflict(c, babysitter_id, start_ts, end_ts):
+    return c.execute("""
+        SELECT 1 FROM bookings 
+        WHERE babysitter_id = ? AND end_ts > ? AND start_ts < ? 
+          AND status IN ('Confirmado', 'Em Curso') LIMIT 1
+    """, (babysitter_id, start_ts, end_ts)).fetchone() is not None
+
+def get_available_babysitters(data, hora, duracao_horas):
+    return get_all_babysitters(available_for=booking_interval(data, hora, duracao_horas))
+
+# --- LOCALIZAÇÃO / PROCURA POR PROXIMIDADE ---
+
+def set_user_location(user_id, latitude, longitude):
+    """Guarda as coordenadas e a célula da grelha geoespacial (geo_index)"""
+    conn = get_connection()
+    try:
+        run_write(conn, lambda c: c.execute("UPDATE users SET latitude=?, longitude=?, geo_cell=? WHERE id=?",
+                                            (latitude, longitude, geo_index.cell_for(latitude, longitude), user_id)))
+        _cache.invalidate('users')
+        return True
+    finally:
+        conn.close()
+
+def get_users_missing_location(role):
+    conn = get_connection()
+    try:
+        return conn.execute("SELECT id, location FROM users WHERE role=? AND geo_cell IS NULL", (role,)).fetchall()
+    finally:
+        conn.close()
+
+@cached(_cache, tags=('users', 'bookings'))
+def find_nearest_babysitters(latitude, longitude, k=20, radius_km=25.0, available_for=None):
+    """
+    As K babysitters mais próximas dentro do raio, ordenadas por distância (coluna distancia_km).
+    Só lê as linhas das células da grelha que cobrem o raio.
+    available_for=(início, fim) exclui quem tem reservas sobrepostas.
+    """
+    cells = geo_index.cells_within(latitude, longitude, radius_km)
+    conn = get_connection()
+    try:
+        marks = ', '.join('?' * len(cells))
+        # Primeiro só id + coordenadas; as colunas completas apenas para as K escolhidas
+        query = f"SELECT id, latitude, longitude FROM users WHERE role='Babysitter' AND geo_cell IN ({marks})"
+        params = list(cells)
+        if available_for:
+            query += f" AND {_AVAILABLE_SQL}"
+            params += list(available_for)
+        rows = conn.execute(query, params).fetchall()
+        ids, dists = geo_index.nearest(rows, latitude, longitude, k, radius_km)
+        marks = ', '.join('?' * len(ids))
+        df = pd.read_sql_query(f"SELECT {BABYSITTER_COLUMNS} FROM users WHERE id IN ({marks})", conn, params=ids)
+    finally:
+        conn.close()
+    # Repor a ordem por distância
+    order = {b_id: i for i, b_id in enumerate(ids)}
+    df = df.sort_values('id', key=lambda col: col.map(order)).reset_index(drop=True)
+    df['distancia_km'] = dists
+    return df
+
 # --- PEDIDOS ---
 
 def create_booking(client_id, babysitter_data, data_servico):
+    """Grava a reserva. Levanta BookingConflictError se a babysitter já estiver ocupada nesse horário."""
     conn = get_connection()
-    c = conn.cursor()
     try:
         # Obter ID da Babysitter (suporta dict ou pandas series)
         b_id = babysitter_data.get('id') if isinstance(babysitter_data, dict) else babysitter_data['id']
@@ -43,78 +386,200 @@ def create_booking(client_id, babysitter_data, data_servico):
         # Converter objetos de data para string
         d_str = data_servico['data'].strftime('%Y-%m-%d')
         h_str = data_servico['hora'].strftime('%H:%M')
+        start_ts, end_ts = booking_interval(data_servico['data'], data_servico['hora'], data_servico['duracao'])
         
-        c.execute('''
-            INSERT INTO bookings (
-                client_id, babysitter_id, service_date, start_time, duration, 
-                children_count, children_ages, address, location_city, notes, 
-                total_price, status
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 'Confirmado')
-        ''', (
-            client_id, b_id, d_str, h_str, 
-            data_servico['duracao'], data_servico['criancas'], data_servico['idades'], 
-            data_servico['morada'], "Lisboa", data_servico['obs'], 
-            data_servico['calculo']['total']
-        ))
-        conn.commit()
+        def _write(c):
+            # Verificação dentro da transação (BEGIN IMMEDIATE): dois pedidos simultâneos não passam ambos
+            if _has_conflict(c, b_id, start_ts, end_ts):
+                raise BookingConflictError(f"Babysitter {b_id} indisponível entre {start_ts} e {end_ts}")
+            new_id = c.execute('''
+                INSERT INTO bookings (
+                    client_id, babysitter_id, service_date, start_time, duration, 
+                    children_count, children_ages, address, location_city, notes, 
+                    total_price, status, start_ts, end_ts
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 'Confirmado', ?, ?)
+            ''', (
+                client_id, b_id, d_str, h_str, 
+                data_servico['duracao'], data_servico['criancas'], data_servico['idades'], 
+                data_servico['morada'], "Lisboa", data_servico['obs'], 
+                data_servico['calculo']['total'], start_ts, end_ts
+            )).lastrowid
+            _record_booking_event(c, new_id, 'created', status='Confirmado', total_price=data_servico['calculo']['total'],
+                                  service_date=d_str, start_time=h_str, duration=data_servico['duracao'])
+
+        run_write(conn, _write)
+        _cache.invalidate('bookings')   # disponibilidade das listagens
         return True
+    except BookingConflictError:
+        raise
     except Exception as e:
         print(f"❌ Erro SQL: {e}")
         return False
     finally:
         conn.close()
 
-def get_user_bookings(user_id, role):
+# --- RESERVAS DE UM UTILIZADOR ---
+# Coluna pedida -> expressão SQL. As datas/horas chegam já convertidas (conversores do db_rows).
+# 'Babysitter' / 'Cliente' = nome da outra parte (JOIN só quando a coluna é pedida).
+BOOKING_COLUMNS = {
+    'id': 'b.id',
+    'Data': 'b.service_date AS "Data [date_iso]"',
+    'Hora': 'b.start_time AS "Hora [time_hm]"',
+    'Babysitter': 's.name AS Babysitter',
+    'Cliente': 'cl.name AS Cliente',
+    'Status': 'b.status AS Status',
+    'Valor': 'b.total_price AS Valor',
+    'Local': 'b.address AS Local',
+    'Duração': 'b.duration AS "Duração"',
+    'client_id': 'b.client_id',
+    'babysitter_id': 'b.babysitter_id',
+    'extension_minutes': 'b.extension_minutes',
+    'check_in_time': 'b.check_in_time AS "check_in_time [datetime_iso]"',
+}
+
+def default_booking_columns(role):
+    """Colunas das tabelas de reservas: a outra parte é a babysitter (cliente) ou o cliente (babysitter)"""
+    other = 'Babysitter' if role == 'Cliente' else 'Cliente'
+    return ('id', 'Data', 'Hora', other, 'Status', 'Valor', 'Local')
+
+_BOOKING_JOINS = {
+    'Babysitter': "JOIN users s ON s.id = b.babysitter_id",
+    'Cliente': "JOIN users cl ON cl.id = b.client_id",
+}
+
+def _bookings_where(user_id, role, when, date_from, date_to, statuses):
+    """WHERE comum a get_user_bookings / count_user_bookings"""
+    where = ["b.client_id = ?" if role == 'Cliente' else "b.babysitter_id = ?"]
+    params = [user_id]
+    today = datetime.now().date().isoformat()
+    if when == 'past':
+        where.append("b.service_date < ?"); params.append(today)
+    elif when == 'future':
+        where.append("b.service_date >= ?"); params.append(today)
+    if date_from is not None:
+        where.append("b.service_date >= ?"); params.append(str(date_from))
+    if date_to is not None:
+        where.append("b.service_date <= ?"); params.append(str(date_to))
+    if statuses:
+        where.append(f"b.status IN ({', '.join('?' * len(statuses))})"); params.extend(statuses)
+    return ' AND '.join(where), params
+
+def get_user_bookings(user_id, role, columns=None, when=None, date_from=None, date_to=None,
+                      statuses=None, limit=None):
+    """
+    Reservas do utilizador (role 'Cliente' ou 'Babysitter') como DataFrame.
+    columns: chaves de BOOKING_COLUMNS (por omissão default_booking_columns(role)).
+    when: None (todas), 'past' (antes de hoje, mais recentes primeiro) ou 'future' (de hoje em diante, mais próximas primeiro).
+    date_from / date_to (inclusivos) e statuses filtram no SQL; limit corta no SQL.
+    """
+    columns = columns or default_booking_columns(role)
+    where, params = _bookings_where(user_id, role, when, date_from, date_to, statuses)
+    joins = ' '.join(_BOOKING_JOINS[c] for c in _BOOKING_JOINS if c in columns)
+    direction = 'ASC' if when == 'future' else 'DESC'
+    query = f"""
+        SELECT {', '.join(BOOKING_COLUMNS[c] for c in columns)}
+        FROM bookings b {joins}
+        WHERE {where}
+        ORDER BY b.service_date {direction}, b.start_time {direction}
+    """
+    if limit is not None:
+        query += " LIMIT ?"; params.append(limit)
     conn = get_connection()
     try:
-        if role == 'Cliente':
-            query = "SELECT b.*, u.name as Babysitter, u.id as babysitter_id, b.status as Status, b.total_price as Valor FROM bookings b JOIN users u ON b.babysitter_id = u.id WHERE b.client_id = ? ORDER BY b.service_date DESC"
-        else:
-            query = "SELECT b.*, u.name as Cliente, b.status as Status, b.total_price as Valor FROM bookings b JOIN users u ON b.client_id = u.id WHERE b.babysitter_id = ? ORDER BY b.service_date DESC"
-            
-        df = pd.read_sql_query(query, conn, params=(user_id,))
-        
-        if not df.empty:
-            df['Data'] = pd.to_datetime(df['service_date']).dt.date
-            # Tentar converter hora, gerindo erros se formato for diferente
-            df['Hora'] = pd.to_datetime(df['start_time'], format='%H:%M', errors='coerce').dt.time
-            
-        return df
+        return pd.read_sql_query(query, conn, params=params)
     finally:
         conn.close()
 
+def count_user_bookings(user_id, role, date_from=None, date_to=None, statuses=None):
+    """{'past': n, 'future': n} numa única query (métricas do dashboard sem carregar as linhas)"""
+    where, params = _bookings_where(user_id, role, None, date_from, date_to, statuses)
+    today = datetime.now().date().isoformat()
+    conn = get_connection()
+    try:
+        past, future = conn.execute(f"""
+            SELECT coalesce(sum(b.service_date < ?), 0), coalesce(sum(b.service_date >= ?), 0)
+            FROM bookings b WHERE {where}
+        """, [today, today] + params).fetchone()
+        return {'past': past, 'future': future}
+    finally:
+        conn.close()
+
+_ACTIVE_BOOKING_SQL = """
+    SELECT b.id, b.client_id, b.babysitter_id,
+           b.service_date AS "service_date [date_iso]", b.start_time AS "start_time [time_hm]",
+           b.duration, b.status, b.total_price, b.address, b.notes, b.children_count, b.children_ages,
+           coalesce(b.extension_minutes, 0), coalesce(b.pending_extension, 0),
+           b.check_in_time AS "check_in_time [datetime_iso]",
+           u.name, u.email, u.photo_url, s.price_per_hour
+    FROM bookings b 
+    JOIN users u ON u.id = b.{other}
+    JOIN users s ON s.id = b.babysitter_id
+    WHERE b.{own} = ? 
+    AND b.status IN ('Confirmado', 'Em Curso')
+    ORDER BY b.service_date ASC, b.start_time ASC LIMIT 1
+"""
+
 def get_upcoming_or_active_booking(user_id, role):
+    """ActiveBooking (datas já convertidas) ou None. other_* = cliente (role Babysitter) ou babysitter (role Cliente)"""
+    if role == 'Babysitter':
+        query = _ACTIVE_BOOKING_SQL.format(own='babysitter_id', other='client_id')
+    else: # Cliente
+        query = _ACTIVE_BOOKING_SQL.format(own='client_id', other='babysitter_id')
     conn = get_connection()
     try:
-        # Adicionei 'pending_extension' e 'u.email' às queries
-        if role == 'Babysitter':
-            query = """
-            SELECT b.*, u.name as ClientName, u.email as ClientEmail, u.photo_url as ClientPhoto 
-            FROM bookings b 
-            JOIN users u ON b.client_id = u.id 
-            WHERE b.babysitter_id = ? 
-            AND b.status IN ('Confirmado', 'Em Curso')
-            ORDER BY b.service_date ASC, b.start_time ASC LIMIT 1
-            """
-        else: # Cliente
-            query = """
-            SELECT b.*, u.name as BabysitterName, u.email as BabysitterEmail, u.price_per_hour, u.photo_url as BabysitterPhoto
-            FROM bookings b 
-            JOIN users u ON b.babysitter_id = u.id 
-            WHERE b.client_id = ? 
-            AND b.status IN ('Confirmado', 'Em Curso')
-            ORDER BY b.service_date ASC, b.start_time ASC LIMIT 1
-            """
-        
-        df = pd.read_sql_query(query, conn, params=(user_id,))
-        if not df.empty:
-            row = df.iloc[0].to_dict()
-            row['Data'] = pd.to_datetime(row['service_date']).date()
-            row['Hora'] = pd.to_datetime(row['start_time'], format='%H:%M').time()
-            if row['check_in_time']:
-                row['check_in_time'] = pd.to_datetime(row['check_in_time'])
-            return row
-        return None
+        return fetch_one(conn, ActiveBooking, query, (user_id,))
+    finally:
+        conn.close()
+
+# --- SERVIÇOS EM CURSO ---
+# Minutos restantes e progresso calculados no SQL a partir de check_in_time / scheduled_end
+# (scheduled_end já inclui as extensões aceites). Uma só query serve o temporizador de cada
+# utilizador e a vista de operações com todos os serviços em curso.
+_ACTIVE_SERVICES_SQL = """
+    SELECT id, client_id, babysitter_id, client_name, babysitter_name,
+           check_in_time AS "check_in_time [datetime_iso]",
+           scheduled_end AS "scheduled_end [datetime_iso]",
+           extension_minutes, pending_extension,
+           CAST(max(remaining, 0) / 60 AS INTEGER) AS minutes_left,
+           CASE WHEN total > 0 THEN min(max(1.0 - remaining / total, 0.0), 1.0) ELSE 1.0 END AS progress,
+           remaining <= 0 AS overdue
+    FROM (
+        SELECT b.id, b.client_id, b.babysitter_id, cl.name AS client_name, s.name AS babysitter_name,
+               b.check_in_time, b.scheduled_end,
+               coalesce(b.extension_minutes, 0) AS extension_minutes,
+               coalesce(b.pending_extension, 0) AS pending_extension,
+               (julianday(b.scheduled_end) - julianday(?)) * 86400 AS remaining,
+               (julianday(b.scheduled_end) - julianday(b.check_in_time)) * 86400 AS total
+        FROM bookings b
+        JOIN users cl ON cl.id = b.client_id
+        JOIN users s ON s.id = b.babysitter_id
+        WHERE b.status = 'Em Curso' AND b.scheduled_end IS NOT NULL {where}
+        ORDER BY b.scheduled_end
+    )
+"""
+
+def get_active_services(user_id=None, role=None, now=None):
+    """
+    Serviços em curso (lista de ActiveService), os que acabam primeiro à frente.
+    Com user_id/role ('Cliente' ou 'Babysitter') só os desse utilizador; sem, todos (vista de operações).
+    """
+    now = (now or datetime.now()).strftime('%Y-%m-%d %H:%M:%S')
+    where, params = "", [now]
+    if user_id is not None:
+        where = "AND b.client_id = ?" if role == 'Cliente' else "AND b.babysitter_id = ?"
+        params.append(user_id)
+    conn = get_connection()
+    try:
+        return fetch_all(conn, ActiveService, _ACTIVE_SERVICES_SQL.format(where=where), params)
+    finally:
+        conn.close()
+
+def get_active_service(booking_id, now=None):
+    """ActiveService de uma reserva em curso (temporizadores dos dashboards) ou None"""
+    now = (now or datetime.now()).strftime('%Y-%m-%d %H:%M:%S')
+    conn = get_connection()
+    try:
+        return fetch_one(conn, ActiveService, _ACTIVE_SERVICES_SQL.format(where="AND b.id = ?"), (now, booking_id))
     finally:
         conn.close()
 
@@ -123,10 +588,11 @@ def get_upcoming_or_active_booking(user_id, role):
 def request_extension_db(booking_id, minutes):
     """Pais pedem extensão (fica pendente)"""
     conn = get_connection()
-    c = conn.cursor()
-    try:
+    def _write(c):
         c.execute("UPDATE bookings SET pending_extension = ? WHERE id=?", (minutes, booking_id))
-        conn.commit()
+        _record_booking_event(c, booking_id, 'extension_requested', minutes=minutes)
+    try:
+        run_write(conn, _write)
         return True
     finally:
         conn.close()
@@ -134,72 +600,45 @@ def request_extension_db(booking_id, minutes):
 def resolve_extension_db(booking_id, decision, extra_minutes, cost_increase):
     """Babysitter decide: decision=True (Aceita) ou False (Recusa)"""
     conn = get_connection()
-    c = conn.cursor()
-    try:
+    def _write(c):
         if decision:
             # Aceitou: Soma ao tempo oficial, soma ao preço e limpa o pendente
             c.execute("""
                 UPDATE bookings 
                 SET extension_minutes = extension_minutes + ?, 
                     total_price = total_price + ?,
-                    pending_extension = 0
+                    pending_extension = 0,
+                    end_ts = datetime(end_ts, '+' || ? || ' minutes'),
+                    scheduled_end = datetime(scheduled_end, '+' || ? || ' minutes')
                 WHERE id=?
-            """, (extra_minutes, cost_increase, booking_id))
+            """, (extra_minutes, cost_increase, extra_minutes, extra_minutes, booking_id))
+            _record_booking_event(c, booking_id, 'extension_accepted', minutes=extra_minutes, cost_increase=cost_increase)
         else:
             # Recusou: Apenas limpa o pendente
             c.execute("UPDATE bookings SET pending_extension = 0 WHERE id=?", (booking_id,))
-        conn.commit()
-        return True
-    finally:
-        conn.close()
-
-def get_user_bookings(user_id, role):
-    conn = get_connection()
+            _record_booking_event(c, booking_id, 'extension_declined')
     try:
-        # Garante que usamos aliases SQL para facilitar o display no frontend
-        if role == 'Cliente':
-            query = """
-                SELECT b.service_date as Data, b.start_time as Hora, 
-                       u.name as Babysitter, b.status as Status, 
-                       b.total_price as Valor, b.address as Local
-                FROM bookings b 
-                JOIN users u ON b.babysitter_id = u.id 
-                WHERE b.client_id = ? 
-                ORDER BY b.service_date DESC, b.start_time DESC
-            """
-        else:
-            query = """
-                SELECT b.service_date as Data, b.start_time as Hora, 
-                       u.name as Cliente, b.status as Status, 
-                       b.total_price as Valor, b.address as Local
-                FROM bookings b 
-                JOIN users u ON b.client_id = u.id 
-                WHERE b.babysitter_id = ? 
-                ORDER BY b.service_date DESC, b.start_time DESC
-            """
-            
-        df = pd.read_sql_query(query, conn, params=(user_id,))
-        
-        if not df.empty:
-            df['Data'] = pd.to_datetime(df['Data']).dt.date
-            df['Hora'] = pd.to_datetime(df['Hora'], format='%H:%M', errors='coerce').dt.time
-            
-        return df
+        run_write(conn, _write)
+        if decision:
+            _cache.invalidate('bookings')   # end_ts mudou
+        return True
     finally:
         conn.close()
 
 def start_service_db(booking_id, health_report):
     """A Babysitter dá início ao serviço"""
     conn = get_connection()
-    c = conn.cursor()
     now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    try:
+    def _write(c):
         c.execute("""
             UPDATE bookings 
-            SET status='Em Curso', check_in_time=?, health_report=? 
+            SET status='Em Curso', check_in_time=?, health_report=?,
+                scheduled_end = datetime(?, '+' || (duration * 60 + coalesce(extension_minutes, 0)) || ' minutes')
             WHERE id=?
-        """, (now, health_report, booking_id))
-        conn.commit()
+        """, (now, health_report, now, booking_id))
+        _record_booking_event(c, booking_id, 'started', status='Em Curso', check_in_time=now)
+    try:
+        run_write(conn, _write)
         return True
     except Exception as e:
         print(e); return False
@@ -209,15 +648,40 @@ def start_service_db(booking_id, health_report):
 def extend_service_db(booking_id, extra_minutes, cost_increase):
     """O Cliente adiciona tempo extra"""
     conn = get_connection()
-    c = conn.cursor()
-    try:
+    def _write(c):
         c.execute("""
             UPDATE bookings 
             SET extension_minutes = extension_minutes + ?, 
-                total_price = total_price + ? 
+                total_price = total_price + ?,
+                end_ts = datetime(end_ts, '+' || ? || ' minutes'),
+                scheduled_end = datetime(scheduled_end, '+' || ? || ' minutes')
             WHERE id=?
-        """, (extra_minutes, cost_increase, booking_id))
-        conn.commit()
+        """, (extra_minutes, cost_increase, extra_minutes, extra_minutes, booking_id))
+        _record_booking_event(c, booking_id, 'extended', minutes=extra_minutes, cost_increase=cost_increase)
+    try:
+        run_write(conn, _write)
+        _cache.invalidate('bookings')
+        return True
+    except Exception as e:
+        print(e); return False
+    finally:
+        conn.close()
+
+def finish_service_db(booking_id):
+    """A Babysitter termina o serviço (a reserva deixa de estar ativa)"""
+    conn = get_connection()
+    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    def _write(c):
+        cur = c.execute("UPDATE bookings SET status='Concluído', actual_end=? WHERE id=? AND status='Em Curso'",
+                        (now, booking_id))
+        if cur.rowcount == 0:
+            return False   # Não estava em curso (ex: já terminado): sem evento
+        _record_booking_event(c, booking_id, 'finished', status='Concluído', finished_at=now)
+        return True
+    try:
+        if not run_write(conn, _write):
+            return False
+        _cache.invalidate('bookings')
         return True
     except Exception as e:
         print(e); return False
@@ -225,13 +689,36 @@ def extend_service_db(booking_id, extra_minutes, cost_increase):
         conn.close()
 
 # --- FUNÇÕES DE CHAT (NOVO) ---
+# Cada par de utilizadores tem uma linha em conversations (user_a < user_b).
+# As mensagens guardam conversation_id, por isso o histórico é uma leitura indexada.
+
+def _conversation_pair(user1, user2):
+    return (user1, user2) if user1 <= user2 else (user2, user1)
+
+def _get_or_create_conversation(c, user1, user2):
+    a, b = _conversation_pair(user1, user2)
+    c.execute("INSERT OR IGNORE INTO conversations (user_a, user_b) VALUES (?, ?)", (a, b))
+    return c.execute("SELECT id FROM conversations WHERE user_a=? AND user_b=?", (a, b)).fetchone()[0]
+
 def send_message_db(sender, receiver, content):
-    """Grava mensagem na base de dados"""
+    """Grava mensagem na base de dados (e atualiza a conversa na mesma transação)"""
     conn = get_connection()
+    def _write(c):
+        conv_id = _get_or_create_conversation(c, sender, receiver)
+        msg_id = c.execute("INSERT INTO messages (conversation_id, sender_email, receiver_email, content) VALUES (?, ?, ?, ?)",
+                           (conv_id, sender, receiver, content)).lastrowid
+        # O contador de não lidas do destinatário sobe
+        c.execute("""
+            UPDATE conversations 
+            SET last_message_id = ?, last_message_at = CURRENT_TIMESTAMP,
+                unread_a = unread_a + (user_a = ?), 
+                unread_b = unread_b + (user_b = ?)
+            WHERE id = ?
+        """, (msg_id, receiver, receiver, conv_id))
+        _bump_unread(c, receiver, sender)
+        bump_versions(c, conversation_topic(conv_id), inbox_topic(receiver))
     try:
-        conn.execute("INSERT INTO messages (sender_email, receiver_email, content) VALUES (?, ?, ?)", 
-                     (sender, receiver, content))
-        conn.commit()
+        run_write(conn, _write)
         return True
     except Exception as e:
         print(f"Erro chat: {e}")
@@ -239,48 +726,114 @@ def send_message_db(sender, receiver, content):
     finally:
         conn.close()
 
-def get_chat_history_db(user1, user2):
-    """Recupera conversa entre duas pessoas"""
+def get_conversation_id(user1, user2):
+    """ID da conversa entre duas pessoas (None se ainda não trocaram mensagens)"""
+    conn = get_connection()
+    try:
+        row = conn.execute("SELECT id FROM conversations WHERE user_a=? AND user_b=?", _conversation_pair(user1, user2)).fetchone()
+        return row[0] if row else None
+    finally:
+        conn.close()
+
+def get_user_conversations(email):
+    """Lista de conversas do utilizador, da mais recente para a mais antiga, com não lidas"""
     conn = get_connection()
     try:
         query = """
-            SELECT sender_email, content, timestamp 
-            FROM messages 
-            WHERE (sender_email = ? AND receiver_email = ?) 
-               OR (sender_email = ? AND receiver_email = ?)
-            ORDER BY timestamp ASC
+            SELECT c.id, c.user_b AS other_email, c.unread_a AS unread, c.last_message_at, m.content AS last_message
+            FROM conversations c LEFT JOIN messages m ON m.id = c.last_message_id
+            WHERE c.user_a = ?
+            UNION ALL
+            SELECT c.id, c.user_a AS other_email, c.unread_b AS unread, c.last_message_at, m.content AS last_message
+            FROM conversations c LEFT JOIN messages m ON m.id = c.last_message_id
+            WHERE c.user_b = ?
+            ORDER BY last_message_at DESC
         """
-        cursor = conn.execute(query, (user1, user2, user2, user1))
-        return cursor.fetchall()
+        return conn.execute(query, (email, email)).fetchall()
     finally:
         conn.close()
 
-# --- FUNÇÕES DE EXTENSÃO DE TEMPO (NOVO) ---
-def request_extension_db(booking_id, minutes):
-    """Cliente pede tempo"""
+def mark_conversation_read(email, other):
+    """Zera as não lidas de 'email' na conversa com 'other' (e desconta no contador global)"""
     conn = get_connection()
+    a, b = _conversation_pair(email, other)
+    def _write(c):
+        row = c.execute("SELECT CASE WHEN user_a = ? THEN unread_a ELSE unread_b END FROM conversations WHERE user_a = ? AND user_b = ?",
+                        (email, a, b)).fetchone()
+        if not row or not row[0]:
+            return
+        c.execute("""
+            UPDATE conversations 
+            SET unread_a = CASE WHEN user_a = ? THEN 0 ELSE unread_a END,
+                unread_b = CASE WHEN user_b = ? THEN 0 ELSE unread_b END
+            WHERE user_a = ? AND user_b = ?
+        """, (email, email, a, b))
+        c.execute("UPDATE user_notifications SET unread_messages = max(0, unread_messages - ?) WHERE email = ?", (row[0], email))
     try:
-        conn.execute("UPDATE bookings SET pending_extension = ? WHERE id=?", (minutes, booking_id))
-        conn.commit()
+        run_write(conn, _write)
+        return True
     finally:
         conn.close()
 
-def resolve_extension_db(booking_id, decision, extra_minutes, cost_increase):
-    """Babysitter aceita (True) ou recusa (False)"""
+# --- NOTIFICAÇÕES (CONTADORES POR UTILIZADOR) ---
+# Mantidos na escrita (send_message_db / mark_conversation_read), lidos por chave primária.
+
+def _bump_unread(c, receiver, sender):
+    c.execute("""
+        INSERT INTO user_notifications (email, unread_messages, last_sender, last_message_at)
+        VALUES (?, 1, ?, CURRENT_TIMESTAMP)
+        ON CONFLICT (email) DO UPDATE SET 
+            unread_messages = unread_messages + 1,
+            last_sender = excluded.last_sender,
+            last_message_at = excluded.last_message_at
+    """, (receiver, sender))
+
+def get_notification_summary(email):
+    """{'unread': N, 'last_sender': ..., 'last_message_at': ...} do utilizador"""
     conn = get_connection()
     try:
-        if decision:
-            # Aceitou: Atualiza tempo, preço e limpa o pendente
-            conn.execute("""
-                UPDATE bookings 
-                SET extension_minutes = extension_minutes + ?, 
-                    total_price = total_price + ?,
-                    pending_extension = 0
-                WHERE id=?
-            """, (extra_minutes, cost_increase, booking_id))
-        else:
-            # Recusou: Só limpa o pendente
-            conn.execute("UPDATE bookings SET pending_extension = 0 WHERE id=?", (booking_id,))
-        conn.commit()
+        row = conn.execute("SELECT unread_messages, last_sender, last_message_at FROM user_notifications WHERE email = ?",
+                           (email,)).fetchone()
+        if not row:
+            return {'unread': 0, 'last_sender': None, 'last_message_at': None}
+        return {'unread': row[0], 'last_sender': row[1], 'last_message_at': row[2]}
+    finally:
+        conn.close()
+
+# --- CHAT INCREMENTAL ---
+CHAT_PAGE_SIZE = 50
+CHAT_SYNC_LIMIT = 200
+
+def get_messages_since(conversation_id, last_id=0, limit=CHAT_SYNC_LIMIT):
+    """
+    Só as mensagens novas da conversa (id > last_id), da mais antiga para a mais recente.
+    No máximo 'limit': se vierem 'limit' linhas, pode haver mais (chamar de novo a partir da última id).
+    """
+    conn = get_connection()
+    try:
+        query = """
+            SELECT id, sender_email, content, timestamp 
+            FROM messages 
+            WHERE conversation_id = ? AND id > ?
+            ORDER BY id ASC LIMIT ?
+        """
+        return conn.execute(query, (conversation_id, last_id, limit)).fetchall()
     finally:
-        conn.close()
\ No newline at end of file
+        conn.close()
+
+def get_messages_before(conversation_id, before_id=None, limit=CHAT_PAGE_SIZE):
+    """Página de mensagens anteriores a before_id (None = as mais recentes), em ordem cronológica"""
+    conn = get_connection()
+    try:
+        query = """
+            SELECT id, sender_email, content, timestamp 
+            FROM messages 
+            WHERE conversation_id = ? AND id < ?
+            ORDER BY id DESC LIMIT ?
+        """
+        upper = before_id if before_id is not None else 2**63 - 1
+        rows = conn.execute(query, (conversation_id, upper, limit)).fetchall()
+        rows.reverse()
+        return rows
+    finally:
+        conn.close()
@@ -0,0 +1,165 @@
+import sqlite3
+import threading
+import time
+
+
+class PooledConnection(sqlite3.Connection):
+    """Ligação SQLite que volta ao pool quando o código chama close()"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._pool = None
+
+    def close(self):
+        if self._pool is None:
+            super().close()
+        else:
+            self._pool.release(self)
+
+    def _real_close(self):
+        super().close()
+
+
+class ConnectionPool:
+    """
+    Pool de ligações SQLite com reutilização por thread.
+
+    - Cada thread reutiliza a mesma ligação enquanto a tiver em uso (chamadas encadeadas).
+    - Ligações livres ficam guardadas (até max_size) em vez de serem fechadas.
+    - O setup (PRAGMAs, etc.) corre uma única vez, quando a ligação é aberta.
+    """
+
+    def __init__(self, database, max_size=8, timeout=10.0, on_connect=None, health_check_interval=30.0,
+                 detect_types=0):
+        self.database = database
+        self.detect_types = detect_types
+        self.max_size = max_size
+        self.timeout = timeout
+        self.on_connect = on_connect
+        self.health_check_interval = health_check_interval
+
+        self._lock = threading.Condition()
+        self._idle = []          # [(conn, last_used)]
+        self._open_count = 0
+        self._local = threading.local()
+        self._stats = {
+            'opens': 0, 'closes': 0, 'checkouts': 0, 'reuses': 0,
+            'waits': 0, 'wait_time': 0.0, 'health_failures': 0,
+        }
+
+    # --- CICLO DE VIDA DAS LIGAÇÕES ---
+
+    def _open(self):
+        conn = sqlite3.connect(self.database, factory=PooledConnection, check_same_thread=False,
+                               detect_types=self.detect_types)
+        if self.on_connect:
+            self.on_connect(conn)
+        conn._pool = self
+        with self._lock:
+            self._stats['opens'] += 1
+        return conn
+
+    def _discard(self, conn, release_slot=True):
+        # release_slot=False: a ligação vai ser substituída e o lugar no pool continua reservado
+        try:
+            conn._real_close()
+        except sqlite3.Error:
+            pass
+        with self._lock:
+            self._stats['closes'] += 1
+            if release_slot:
+                self._open_count -= 1
+                self._lock.notify()
+
+    def _is_healthy(self, conn, last_used):
+        if time.monotonic() - last_used < self.health_check_interval:
+            return True
+        try:
+            conn.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            with self._lock:
+                self._stats['health_failures'] += 1
+            return False
+
+    def acquire(self):
+        # Chamada encadeada na mesma thread: devolve a ligação já em uso
+        current = getattr(self._local, 'conn', None)
+        if current is not None:
+            self._local.depth += 1
+            with self._lock:
+                self._stats['checkouts'] += 1
+                self._stats['reuses'] += 1
+            return current
+
+        conn = None
+        deadline = time.monotonic() + self.timeout
+        with self._lock:
+            self._stats['checkouts'] += 1
+            while True:
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                    self._stats['reuses'] += 1
+                    break
+                if self._open_count < self.max_size:
+                    self._open_count += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(f"Pool esgotado ({self.max_size} ligações em uso)")
+                self._stats['waits'] += 1
+                started = time.monotonic()
+                self._lock.wait(remaining)
+                self._stats['wait_time'] += time.monotonic() - started
+
+        if conn is not None and not self._is_healthy(conn, last_used):
+            # Reabre no mesmo lugar: _open_count nunca passa de max_size
+            self._discard(conn, release_slot=False)
+            conn = None
+
+        if conn is None:
+            try:
+                conn = self._open()
+            except Exception:
+                with self._lock:
+                    self._open_count -= 1
+                    self._lock.notify()
+                raise
+
+        self._local.conn = conn
+        self._local.depth = 1
+        return conn
+
+    def release(self, conn):
+        if getattr(self._local, 'conn', None) is conn:
+            self._local.depth -= 1
+            if self._local.depth > 0:
+                return
+            self._local.conn = None
+
+        # Nunca devolver ao pool uma transação a meio
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            self._discard(conn)
+            return
+
+        with self._lock:
+            self._idle.append((conn, time.monotonic()))
+            self._lock.notify()
+
+    def close_all(self):
+        """Fecha todas as ligações livres (ex: testes ou shutdown)"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            self._discard(conn)
+
+    def stats(self):
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot['open'] = self._open_count
+            snapshot['idle'] = len(self._idle)
+            snapshot['in_use'] = self._open_count - len(self._idle)
+        return snapshot
@@ -0,0 +1,117 @@
+import sqlite3
+from dataclasses import dataclass, fields
+from datetime import date, datetime, time
+
+# ==============================================================================
+# LINHAS TIPADAS (SEM PANDAS)
+# ==============================================================================
+# Para leituras de uma linha / poucas linhas: o cursor constrói diretamente um
+# dataclass com __slots__ e as datas chegam já convertidas pelo sqlite3.
+#
+# Conversão: a ligação usa detect_types=PARSE_COLNAMES e a query indica o tipo
+# no alias da coluna, ex: SELECT service_date AS "service_date [date_iso]".
+# (Nomes próprios para não colidir com os conversores 'date'/'timestamp' do sqlite3.)
+
+DETECT_TYPES = sqlite3.PARSE_COLNAMES
+
+
+def _to_date(raw):
+    return date.fromisoformat(raw.decode()[:10])
+
+def _to_time(raw):
+    return time.fromisoformat(raw.decode())
+
+def _to_datetime(raw):
+    return datetime.fromisoformat(raw.decode())
+
+sqlite3.register_converter('date_iso', _to_date)
+sqlite3.register_converter('time_hm', _to_time)
+sqlite3.register_converter('datetime_iso', _to_datetime)
+
+
+class RowMixin:
+    """Acesso tipo dicionário (row['campo'], row.get('campo')) para o código que já usava dicts"""
+    __slots__ = ()
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+
+    def to_dict(self):
+        return {f.name: getattr(self, f.name) for f in fields(self)}
+
+    @classmethod
+    def row_factory(cls, cursor, row):
+        return cls(*row)
+
+
+def fetch_one(conn, cls, query, params=()):
+    cur = conn.cursor()
+    cur.row_factory = cls.row_factory
+    return cur.execute(query, params).fetchone()
+
+
+def fetch_all(conn, cls, query, params=()):
+    cur = conn.cursor()
+    cur.row_factory = cls.row_factory
+    return cur.execute(query, params).fetchall()
+
+
+# --- TIPOS ---
+
+@dataclass(slots=True)
+class ActiveBooking(RowMixin):
+    """Próxima reserva / reserva em curso (dashboards). other_* = a outra parte da reserva"""
+    id: int
+    client_id: int
+    babysitter_id: int
+    service_date: date
+    start_time: time
+    duration: int
+    status: str
+    total_price: float
+    address: str
+    notes: str
+    children_count: int
+    children_ages: str
+    extension_minutes: int
+    pending_extension: int
+    check_in_time: datetime
+    other_name: str
+    other_email: str
+    other_photo: str
+    price_per_hour: float
+
+
+@dataclass(slots=True)
+class ActiveService(RowMixin):
+    """Serviço em curso com o tempo restante já calculado no SQL (db_manager.get_active_services)"""
+    id: int
+    client_id: int
+    babysitter_id: int
+    client_name: str
+    babysitter_name: str
+    check_in_time: datetime
+    scheduled_end: datetime
+    extension_minutes: int
+    pending_extension: int
+    minutes_left: int
+    progress: float
+    overdue: bool
+
+
+@dataclass(slots=True, frozen=True)
+class UserProfile(RowMixin):
+    """Imutável: pode ser partilhado pela cache de dados de referência"""
+    id: int
+    name: str
+    email: str
+    phone: str
+    location: str
+    bio: str
+    price_per_hour: float
@@ -1,80 +1,29 @@
-import sqlite3
+import sys
 
-def create_database():
-    conn = sqlite3.connect('babyconnect.db')
-    c = conn.cursor()
+from db_config import DB_NAME, connect, run_write
+from migrations import migrate
 
-    # 1. TABELA UTILIZADORES
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            email TEXT UNIQUE NOT NULL,
-            password TEXT NOT NULL,
-            name TEXT NOT NULL,
-            role TEXT NOT NULL,
-            phone TEXT,
-            location TEXT,
-            photo_url TEXT,
-            bio TEXT,
-            price_per_hour REAL DEFAULT 10.0,
-            rating REAL DEFAULT 5.0,
-            years_experience INTEGER
-        )
-    ''')
+# SEED DATA (Utilizadores de demonstração)
+SEED_USERS = [
+    ('admin@email.com', 'admin', 'Administrador', 'Admin', None, None, None, None),
+    ('cliente@email.com', '123', 'Família Rodrigues', 'Cliente', '912345678', 'Lisboa', None, None),
+    ('baba@email.com', '123', 'Maria Oliveira', 'Babysitter', '910000001', 'Lisboa', 'https://api.dicebear.com/7.x/avataaars/svg?seed=Maria', 'Educadora experiente.')
+]
 
-    # 2. TABELA PEDIDOS (Com todas as colunas de Tempo Real)
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS bookings (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            client_id INTEGER NOT NULL,
-            babysitter_id INTEGER NOT NULL,
-            service_date TEXT NOT NULL,
-            start_time TEXT NOT NULL,
-            duration INTEGER NOT NULL,
-            children_count INTEGER,
-            children_ages TEXT,
-            address TEXT NOT NULL,
-            location_city TEXT,
-            notes TEXT,
-            status TEXT DEFAULT 'Confirmado', 
-            total_price REAL,
-            
-            check_in_time TEXT,
-            health_report TEXT,
-            extension_minutes INTEGER DEFAULT 0,
-            pending_extension INTEGER DEFAULT 0, -- PARA AS NOTIFICAÇÕES
-            
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (client_id) REFERENCES users (id),
-            FOREIGN KEY (babysitter_id) REFERENCES users (id)
-        )
-    ''')
+def create_database(db_name=DB_NAME):
+    # Mesmos PRAGMAs (WAL, busy timeout...) que as ligações do db_manager
+    conn = connect(db_name)
+    try:
+        # Tabelas, colunas e índices vêm todos das migrações versionadas
+        version = migrate(conn, verbose=True)
 
-    # 3. NOVA TABELA: MENSAGENS (Para o Chat funcionar entre contas)
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS messages (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            sender_email TEXT NOT NULL,
-            receiver_email TEXT NOT NULL,
-            content TEXT NOT NULL,
-            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-
-    # SEED DATA (Utilizadores)
-    users = [
-        ('admin@email.com', 'admin', 'Administrador', 'Admin', None, None, None, None),
-        ('cliente@email.com', '123', 'Família Rodrigues', 'Cliente', '912345678', 'Lisboa', None, None),
-        ('baba@email.com', '123', 'Maria Oliveira', 'Babysitter', '910000001', 'Lisboa', 'https://api.dicebear.com/7.x/avataaars/svg?seed=Maria', 'Educadora experiente.')
-    ]
-    c.executemany('''
-        INSERT OR IGNORE INTO users (email, password, name, role, phone, location, photo_url, bio, price_per_hour) 
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, 10.0)
-    ''', users)
-
-    conn.commit()
-    conn.close()
-    print("✅ Base de Dados REPARADA com Sucesso (Chat + Extensões)!")
+        run_write(conn, lambda c: c.executemany('''
+            INSERT OR IGNORE INTO users (email, password, name, role, phone, location, photo_url, bio, price_per_hour) 
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, 10.0)
+        ''', SEED_USERS))
+    finally:
+        conn.close()
+    print(f"✅ Base de Dados pronta (esquema v{version})!")
 
 if __name__ == '__main__':
-    create_database()
\ No newline at end of file
+    create_database(sys.argv[1] if len(sys.argv) > 1 else DB_NAME)
@@ -0,0 +1,76 @@
+import math
+import sys
+
+import numpy as np
+
+import pricing
+
+# ==============================================================================
+# ÍNDICE GEOESPACIAL EM GRELHA (GUARDADO NO SQLITE)
+# ==============================================================================
+# Cada utilizador com coordenadas tem users.geo_cell = célula de CELL_DEG x CELL_DEG graus.
+# Procurar num raio = ler só as células que o cobrem (índice role + geo_cell) e
+# calcular a distância exata apenas para essas linhas.
+
+CELL_DEG = 0.1                  # ~11 km de latitude
+LON_CELLS = int(360 / CELL_DEG)
+KM_PER_DEG_LAT = 111.32
+
+
+def cell_for(lat, lon):
+    if lat is None or lon is None:
+        return None
+    row = int(math.floor((lat + 90.0) / CELL_DEG))
+    col = int(math.floor((lon + 180.0) / CELL_DEG)) % LON_CELLS
+    return row * LON_CELLS + col
+
+
+def cells_within(lat, lon, radius_km):
+    """Todas as células que intersetam o quadrado que contém o círculo (lat, lon, raio)"""
+    dlat = radius_km / KM_PER_DEG_LAT
+    # perto dos polos o cos -> 0; limitar para não explodir o número de células
+    dlon = radius_km / (KM_PER_DEG_LAT * max(math.cos(math.radians(lat)), 0.01))
+    row_min = int(math.floor((max(lat - dlat, -90.0) + 90.0) / CELL_DEG))
+    row_max = int(math.floor((min(lat + dlat, 90.0) + 90.0) / CELL_DEG))
+    col_min = int(math.floor((lon - dlon + 180.0) / CELL_DEG))
+    col_max = int(math.floor((lon + dlon + 180.0) / CELL_DEG))
+    if col_max - col_min + 1 >= LON_CELLS:
+        col_min, col_max = 0, LON_CELLS - 1
+    return [row * LON_CELLS + (col % LON_CELLS)
+            for row in range(row_min, row_max + 1)
+            for col in range(col_min, col_max + 1)]
+
+
+def nearest(rows, lat, lon, k, radius_km):
+    """
+    rows = [(id, latitude, longitude), ...] das células candidatas.
+    Devolve (ids, distâncias) dos K mais próximos dentro do raio, por ordem de distância.
+    """
+    if not rows:
+        return [], np.empty(0)
+    data = np.asarray(rows, dtype=float)
+    dist = pricing.haversine_km(data[:, 1], data[:, 2], lat, lon)
+    inside = np.flatnonzero(dist <= radius_km)
+    if len(inside) > k:
+        inside = inside[np.argpartition(dist[inside], k - 1)[:k]]
+    inside = inside[np.argsort(dist[inside], kind='stable')]
+    return [int(rows[i][0]) for i in inside], dist[inside]
+
+
+if __name__ == '__main__':
+    # Uso: python geo_index.py [ficheiro.db]
+    # Geocodifica a localização (texto) das babysitters que ainda não têm coordenadas.
+    import db_manager as db
+    from geocoding import get_geocoder
+    if len(sys.argv) > 1:
+        db.configure_pool(db_name=sys.argv[1])
+    geocoder = get_geocoder()
+    done = 0
+    for user_id, location in db.get_users_missing_location('Babysitter'):
+        if not location:
+            continue
+        result = geocoder.geocode(f"{location}, Portugal")
+        if result:
+            db.set_user_location(user_id, result.latitude, result.longitude)
+            done += 1
+    print(f"✅ {done} babysitter(s) com coordenadas atualizadas.")
@@ -0,0 +1,180 @@
+import threading
+import time
+import unicodedata
+from collections import OrderedDict, namedtuple
+
+import db_manager as db
+from db_config import run_write
+
+# ==============================================================================
+# GEOCODING COM CACHE (LRU EM MEMÓRIA -> SQLITE -> BACKEND)
+# ==============================================================================
+# Mesmo formato que o app.py já usa do geopy (location.latitude / location.longitude)
+GeoResult = namedtuple('GeoResult', ['latitude', 'longitude', 'address'])
+
+CACHE_TTL = 30 * 24 * 3600        # moradas encontradas: 30 dias
+NEGATIVE_TTL = 24 * 3600          # moradas não encontradas: 1 dia
+LRU_SIZE = 1024
+
+
+def normalize_address(address):
+    """'  Rua  do Aranha, 13 ,LISBOA ' -> 'rua do aranha, 13, lisboa' (chave da cache)"""
+    text = unicodedata.normalize('NFKC', address).casefold()
+    parts = [' '.join(p.split()) for p in text.split(',')]
+    return ', '.join(p for p in parts if p)
+
+
+# --- BACKENDS ---
+
+class GeocoderBackend:
+    """Interface: geocode(query) -> GeoResult ou None. Erros de rede devem lançar exceção."""
+
+    def geocode(self, query):
+        raise NotImplementedError
+
+
+class NominatimBackend(GeocoderBackend):
+    def __init__(self, user_agent="babyconnect_app_vfinal", timeout=10):
+        from geopy.geocoders import Nominatim
+        self._geolocator = Nominatim(user_agent=user_agent)
+        self.timeout = timeout
+
+    def geocode(self, query):
+        location = self._geolocator.geocode(query, timeout=self.timeout)
+        if location is None:
+            return None
+        return GeoResult(location.latitude, location.longitude, location.address)
+
+
+class StaticBackend(GeocoderBackend):
+    """Backend local (testes / desenvolvimento offline): {morada normalizada: (lat, lon)}"""
+
+    def __init__(self, places=None):
+        self.places = {normalize_address(k): v for k, v in (places or {}).items()}
+        self.calls = 0
+
+    def geocode(self, query):
+        self.calls += 1
+        coords = self.places.get(normalize_address(query))
+        return GeoResult(coords[0], coords[1], query) if coords else None
+
+
+# --- CACHE ---
+
+class CachedGeocoder:
+    def __init__(self, backend, ttl=CACHE_TTL, negative_ttl=NEGATIVE_TTL, lru_size=LRU_SIZE):
+        self.backend = backend
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.lru_size = lru_size
+        self._lru = OrderedDict()     # chave -> (expira_em, GeoResult ou None)
+        self._lock = threading.Lock()
+        self._stats = {'lru_hits': 0, 'db_hits': 0, 'misses': 0, 'negative_hits': 0, 'backend_errors': 0}
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def _lru_get(self, key):
+        with self._lock:
+            entry = self._lru.get(key)
+            if entry is None:
+                return False, None
+            expires_at, result = entry
+            if expires_at < time.time():
+                del self._lru[key]
+                return False, None
+            self._lru.move_to_end(key)
+            return True, result
+
+    def _lru_put(self, key, result, expires_at):
+        with self._lock:
+            self._lru[key] = (expires_at, result)
+            self._lru.move_to_end(key)
+            while len(self._lru) > self.lru_size:
+                self._lru.popitem(last=False)
+
+    def _db_get(self, key):
+        conn = db.get_connection()
+        try:
+            row = conn.execute("""
+                SELECT found, latitude, longitude, display_address, fetched_at
+                FROM geocode_cache WHERE query_key = ?
+            """, (key,)).fetchone()
+        finally:
+            conn.close()
+        if row is None:
+            return False, None, 0
+        found, lat, lon, display, fetched_at = row
+        expires_at = fetched_at + (self.ttl if found else self.negative_ttl)
+        if expires_at < time.time():
+            return False, None, 0
+        return True, (GeoResult(lat, lon, display) if found else None), expires_at
+
+    def _db_put(self, key, result, fetched_at):
+        conn = db.get_connection()
+        try:
+            run_write(conn, lambda c: c.execute("""
+                INSERT OR REPLACE INTO geocode_cache (query_key, found, latitude, longitude, display_address, fetched_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (key, 1 if result else 0,
+                  result.latitude if result else None, result.longitude if result else None,
+                  result.address if result else None, fetched_at)))
+        finally:
+            conn.close()
+
+    def geocode(self, address):
+        key = normalize_address(address)
+        hit, result = self._lru_get(key)
+        if hit:
+            self._count('lru_hits' if result else 'negative_hits')
+            return result
+
+        hit, result, expires_at = self._db_get(key)
+        if hit:
+            self._count('db_hits' if result else 'negative_hits')
+            self._lru_put(key, result, expires_at)
+            return result
+
+        self._count('misses')
+        try:
+            result = self.backend.geocode(address)
+        except Exception as e:
+            # Falha de rede/serviço: não guardar como "não encontrada"
+            self._count('backend_errors')
+            print(f"Erro geocoding: {e}")
+            return None
+
+        now = time.time()
+        self._db_put(key, result, now)
+        self._lru_put(key, result, now + (self.ttl if result else self.negative_ttl))
+        return result
+
+    def stats(self):
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot['lru_size'] = len(self._lru)
+        lookups = snapshot['lru_hits'] + snapshot['db_hits'] + snapshot['negative_hits'] + snapshot['misses']
+        snapshot['hit_rate'] = (lookups - snapshot['misses']) / lookups if lookups else 0.0
+        return snapshot
+
+
+# --- INSTÂNCIA DO PROCESSO ---
+_geocoder = None
+_geocoder_lock = threading.Lock()
+
+def get_geocoder():
+    """Geocoder partilhado por todas as sessões (o app.py é re-executado a cada rerun)"""
+    global _geocoder
+    if _geocoder is None:
+        with _geocoder_lock:
+            if _geocoder is None:
+                _geocoder = CachedGeocoder(NominatimBackend())
+    return _geocoder
+
+def set_geocoder_backend(backend, **kwargs):
+    """Troca o backend (ex: StaticBackend em testes); a cache em memória começa vazia"""
+    global _geocoder
+    with _geocoder_lock:
+        _geocoder = CachedGeocoder(backend, **kwargs)
+    return _geocoder
@@ -0,0 +1,186 @@
+import hashlib
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from fpdf import FPDF
+
+import db_manager as db
+from db_config import run_write
+
+# ==============================================================================
+# FATURAS (PDF) COM CACHE POR VERSÃO DA RESERVA
+# ==============================================================================
+# Cada fatura é gerada uma única vez por (reserva, hash dos campos faturados) e
+# guardada na tabela invoices. Se a reserva mudar (ex: extensão) o hash muda e a
+# fatura é gerada de novo; a versão antiga é apagada.
+# prerender_async() gera em segundo plano (ex: quando o serviço termina), para
+# a página "Detalhes Serviço" só ter de ler os bytes.
+
+# Campos que aparecem na fatura (o hash só depende destes)
+BILLED_FIELDS = ('id', 'service_date', 'start_time', 'duration', 'extension_minutes',
+                 'total_price', 'address', 'client_name', 'babysitter_name')
+
+WORKER_THREADS = 1
+
+
+# SELECT dos BILLED_FIELDS (pela mesma ordem); quem usa acrescenta o WHERE
+BILLING_SELECT = """
+    SELECT b.id, b.service_date, b.start_time, b.duration, coalesce(b.extension_minutes, 0),
+           b.total_price, b.address, cl.name, s.name
+    FROM bookings b
+    JOIN users cl ON cl.id = b.client_id
+    JOIN users s ON s.id = b.babysitter_id
+"""
+
+
+def load_billing(booking_id):
+    """Campos faturados de uma reserva (dict) ou None"""
+    conn = db.get_connection()
+    try:
+        row = conn.execute(BILLING_SELECT + " WHERE b.id = ?", (booking_id,)).fetchone()
+    finally:
+        conn.close()
+    return dict(zip(BILLED_FIELDS, row)) if row else None
+
+
+def billing_hash(billing):
+    payload = json.dumps([billing[f] for f in BILLED_FIELDS], default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _latin1(text):
+    # As fontes base do FPDF só suportam latin-1
+    return str(text).encode('latin-1', 'replace').decode('latin-1')
+
+
+def create_pdf_invoice(billing):
+    """Gera o PDF (bytes) a partir de load_billing(). Função pura: sem Streamlit nem base de dados."""
+    pdf = FPDF()
+    pdf.add_page()
+    pdf.set_font("Arial", "B", 20)
+    pdf.cell(0, 10, "BabyConnect - Fatura Recibo", ln=True, align="C")
+    pdf.set_font("Arial", "", 10)
+    pdf.cell(0, 10, "Conectando Familias e Babysitters", ln=True, align="C")
+    pdf.line(10, 30, 200, 30)
+    pdf.ln(20)
+    pdf.set_font("Arial", "B", 12)
+    pdf.cell(0, 10, _latin1(f"Babysitter: {billing['babysitter_name'] or 'N/A'}"), ln=True)
+    pdf.set_font("Arial", "", 12)
+    pdf.cell(0, 10, _latin1(f"Cliente: {billing['client_name'] or 'N/A'}"), ln=True)
+
+    data_serv = str(billing['service_date'])
+    if len(data_serv) >= 10:
+        data_serv = f"{data_serv[8:10]}/{data_serv[5:7]}/{data_serv[:4]}"
+    pdf.cell(0, 10, f"Data do Servico: {data_serv} {billing['start_time'] or ''}", ln=True)
+    pdf.cell(0, 10, _latin1(f"Local: {billing['address'] or 'N/A'}"), ln=True)
+    pdf.ln(10)
+    pdf.set_fill_color(240, 240, 240)
+    pdf.cell(140, 10, "Descricao", 1, 0, 'L', 1)
+    pdf.cell(50, 10, "Valor (EUR)", 1, 1, 'R', 1)
+    descricao = f"Servico de Babysitting ({billing['duration']}h"
+    if billing['extension_minutes']:
+        descricao += f" + {billing['extension_minutes']} min extra"
+    pdf.cell(140, 10, descricao + ") + Deslocacao", 1, 0, 'L')
+    pdf.cell(50, 10, f"{billing['total_price'] or 0:.2f}", 1, 1, 'R')
+    pdf.set_font("Arial", "B", 12)
+    pdf.cell(140, 10, "TOTAL", 1, 0, 'R')
+    pdf.cell(50, 10, f"{billing['total_price'] or 0:.2f} EUR", 1, 1, 'R')
+    pdf.ln(20)
+    pdf.set_font("Arial", "I", 10)
+    pdf.cell(0, 10, "Obrigado pela preferencia!", ln=True, align="C")
+    return pdf.output(dest='S').encode('latin-1')
+
+
+# --- CACHE (TABELA invoices) ---
+
+_stats_lock = threading.Lock()
+_stats = {'hits': 0, 'renders': 0, 'background_renders': 0, 'errors': 0}
+
+def _count(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+def get_invoice_stats():
+    with _stats_lock:
+        return dict(_stats)
+
+
+def get_cached_invoice(booking_id, billing=None):
+    """Bytes da fatura da versão atual da reserva, ou None se ainda não foi gerada"""
+    billing = billing or load_billing(booking_id)
+    if billing is None:
+        return None
+    conn = db.get_connection()
+    try:
+        row = conn.execute("SELECT pdf FROM invoices WHERE booking_id = ? AND billing_hash = ?",
+                           (booking_id, billing_hash(billing))).fetchone()
+    finally:
+        conn.close()
+    if row:
+        _count('hits')
+        return bytes(row[0])
+    return None
+
+
+def _store(billing, pdf_bytes):
+    digest = billing_hash(billing)
+    def _write(c):
+        c.execute("DELETE FROM invoices WHERE booking_id = ? AND billing_hash <> ?", (billing['id'], digest))
+        c.execute("INSERT OR REPLACE INTO invoices (booking_id, billing_hash, pdf) VALUES (?, ?, ?)",
+                  (billing['id'], digest, pdf_bytes))
+    conn = db.get_connection()
+    try:
+        run_write(conn, _write)
+    finally:
+        conn.close()
+
+
+def get_invoice_pdf(booking_id):
+    """Bytes da fatura: da cache se existir, senão gera e guarda (síncrono)"""
+    billing = load_billing(booking_id)
+    if billing is None:
+        return None
+    cached = get_cached_invoice(booking_id, billing)
+    if cached is not None:
+        return cached
+    pdf_bytes = create_pdf_invoice(billing)
+    _store(billing, pdf_bytes)
+    _count('renders')
+    return pdf_bytes
+
+
+# --- GERAÇÃO EM SEGUNDO PLANO ---
+
+_executor = None
+_pending = set()
+_executor_lock = threading.Lock()
+
+def _render_job(booking_id):
+    try:
+        billing = load_billing(booking_id)
+        if billing is not None and get_cached_invoice(booking_id, billing) is None:
+            _store(billing, create_pdf_invoice(billing))
+            _count('background_renders')
+    except Exception as e:
+        _count('errors')
+        print(f"Erro ao gerar fatura {booking_id}: {e}")
+    finally:
+        with _executor_lock:
+            _pending.discard(booking_id)
+
+def prerender_async(booking_id):
+    """Agenda a geração da fatura (ignorado se já estiver agendada). Não bloqueia."""
+    global _executor
+    with _executor_lock:
+        if booking_id in _pending:
+            return False
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=WORKER_THREADS, thread_name_prefix='invoices')
+        _pending.add(booking_id)
+    _executor.submit(_render_job, booking_id)
+    return True
+
+def is_pending(booking_id):
+    with _executor_lock:
+        return booking_id in _pending
@@ -0,0 +1,364 @@
+import math
+import sys
+
+from db_config import DB_NAME, connect, run_write
+
+# ==============================================================================
+# MIGRAÇÕES DO ESQUEMA
+# ==============================================================================
+# A versão do esquema fica guardada em PRAGMA user_version.
+# Cada migração corre uma única vez, numa transação, pela ordem da lista.
+# REGRA: nunca alterar uma migração já publicada — acrescentar uma nova no fim.
+
+def _has_column(conn, table, column):
+    return any(row[1] == column for row in conn.execute(f"PRAGMA table_info({table})"))
+
+
+def _m001_base_schema(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            email TEXT UNIQUE NOT NULL,
+            password TEXT NOT NULL,
+            name TEXT NOT NULL,
+            role TEXT NOT NULL,
+            phone TEXT,
+            location TEXT,
+            photo_url TEXT,
+            bio TEXT,
+            price_per_hour REAL DEFAULT 10.0,
+            rating REAL DEFAULT 5.0,
+            years_experience INTEGER
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS bookings (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            client_id INTEGER NOT NULL,
+            babysitter_id INTEGER NOT NULL,
+            service_date TEXT NOT NULL,
+            start_time TEXT NOT NULL,
+            duration INTEGER NOT NULL,
+            children_count INTEGER,
+            children_ages TEXT,
+            address TEXT NOT NULL,
+            location_city TEXT,
+            notes TEXT,
+            status TEXT DEFAULT 'Confirmado',
+            total_price REAL,
+
+            check_in_time TEXT,
+            health_report TEXT,
+            extension_minutes INTEGER DEFAULT 0,
+
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (client_id) REFERENCES users (id),
+            FOREIGN KEY (babysitter_id) REFERENCES users (id)
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS messages (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            sender_email TEXT NOT NULL,
+            receiver_email TEXT NOT NULL,
+            content TEXT NOT NULL,
+            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+
+def _m002_pending_extension(conn):
+    # Bases de dados antigas podem já ter a coluna (scripts de reparação antigos)
+    if not _has_column(conn, 'bookings', 'pending_extension'):
+        conn.execute("ALTER TABLE bookings ADD COLUMN pending_extension INTEGER DEFAULT 0")
+
+
+def _m003_conversations(conn):
+    # Par canónico: user_a < user_b (ordem alfabética dos emails)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS conversations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_a TEXT NOT NULL,
+            user_b TEXT NOT NULL,
+            last_message_id INTEGER,
+            last_message_at TIMESTAMP,
+            unread_a INTEGER NOT NULL DEFAULT 0,
+            unread_b INTEGER NOT NULL DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE (user_a, user_b)
+        )
+    ''')
+    if not _has_column(conn, 'messages', 'conversation_id'):
+        conn.execute("ALTER TABLE messages ADD COLUMN conversation_id INTEGER REFERENCES conversations (id)")
+
+    # Backfill das mensagens existentes (estado de leitura desconhecido -> 0 não lidas)
+    conn.execute('''
+        INSERT OR IGNORE INTO conversations (user_a, user_b)
+        SELECT DISTINCT min(sender_email, receiver_email), max(sender_email, receiver_email) FROM messages
+    ''')
+    conn.execute('''
+        UPDATE messages SET conversation_id = (
+            SELECT c.id FROM conversations c
+            WHERE c.user_a = min(messages.sender_email, messages.receiver_email)
+              AND c.user_b = max(messages.sender_email, messages.receiver_email)
+        ) WHERE conversation_id IS NULL
+    ''')
+    conn.execute('''
+        UPDATE conversations SET
+            last_message_id = (SELECT max(m.id) FROM messages m WHERE m.conversation_id = conversations.id),
+            last_message_at = (SELECT m.timestamp FROM messages m WHERE m.conversation_id = conversations.id ORDER BY m.id DESC LIMIT 1)
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_messages_conversation_id ON messages (conversation_id, id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_conversations_user_a ON conversations (user_a, last_message_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_conversations_user_b ON conversations (user_b, last_message_at)")
+
+
+def _m004_user_notifications(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS user_notifications (
+            email TEXT PRIMARY KEY,
+            unread_messages INTEGER NOT NULL DEFAULT 0,
+            last_sender TEXT,
+            last_message_at TIMESTAMP
+        )
+    ''')
+    # Backfill a partir dos contadores por conversa
+    conn.execute('''
+        INSERT OR REPLACE INTO user_notifications (email, unread_messages)
+        SELECT email, sum(unread) FROM (
+            SELECT user_a AS email, unread_a AS unread FROM conversations
+            UNION ALL
+            SELECT user_b AS email, unread_b AS unread FROM conversations
+        ) GROUP BY email
+    ''')
+
+
+def _m005_change_versions(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS change_versions (
+            topic TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+
+def _m006_booking_events(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS booking_events (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            booking_id INTEGER NOT NULL,
+            event_type TEXT NOT NULL,
+            payload TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (booking_id) REFERENCES bookings (id)
+        )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_booking_events_booking_seq ON booking_events (booking_id, seq)")
+
+
+def _m007_geocode_cache(conn):
+    # found=0 guarda também as moradas não encontradas (cache negativa)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS geocode_cache (
+            query_key TEXT PRIMARY KEY,
+            found INTEGER NOT NULL,
+            latitude REAL,
+            longitude REAL,
+            display_address TEXT,
+            fetched_at REAL NOT NULL
+        )
+    ''')
+
+
+def _m008_user_coordinates(conn):
+    # Coordenadas da babysitter (origem da deslocação no cálculo de preço)
+    for column in ('latitude', 'longitude'):
+        if not _has_column(conn, 'users', column):
+            conn.execute(f"ALTER TABLE users ADD COLUMN {column} REAL")
+
+
+def _m009_geo_cells(conn):
+    # Grelha desta versão fixada aqui (células de 0.1°, 3600 colunas), igual a geo_index.cell_for
+    # na altura: se a grelha mudar, o recálculo é uma migração nova
+    cell_deg, lon_cells = 0.1, 3600
+    if not _has_column(conn, 'users', 'geo_cell'):
+        conn.execute("ALTER TABLE users ADD COLUMN geo_cell INTEGER")
+    rows = conn.execute("SELECT id, latitude, longitude FROM users WHERE latitude IS NOT NULL AND longitude IS NOT NULL").fetchall()
+    conn.executemany("UPDATE users SET geo_cell=? WHERE id=?", [
+        (int(math.floor((lat + 90.0) / cell_deg)) * lon_cells + int(math.floor((lon + 180.0) / cell_deg)) % lon_cells, uid)
+        for uid, lat, lon in rows
+    ])
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_users_role_cell ON users (role, geo_cell)")
+
+
+def _m010_booking_intervals(conn):
+    for column in ('start_ts', 'end_ts'):
+        if not _has_column(conn, 'bookings', column):
+            conn.execute(f"ALTER TABLE bookings ADD COLUMN {column} TEXT")
+    conn.execute('''
+        UPDATE bookings SET
+            start_ts = datetime(service_date || ' ' || start_time),
+            end_ts = datetime(service_date || ' ' || start_time,
+                              '+' || (duration * 60 + coalesce(extension_minutes, 0)) || ' minutes')
+        WHERE start_ts IS NULL
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_bookings_sitter_interval ON bookings (babysitter_id, end_ts, start_ts, status)")
+
+
+def _m011_listing_indexes(conn):
+    # Mesmas expressões que db_manager.list_babysitters_page (NULL -> valor por omissão da coluna)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_users_role_rating ON users (role, coalesce(rating, 5.0) DESC, id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_users_role_price ON users (role, coalesce(price_per_hour, 10.0), id)")
+
+
+def _m012_user_booking_date_indexes(conn):
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_bookings_client_date ON bookings (client_id, service_date, start_time)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_bookings_sitter_date ON bookings (babysitter_id, service_date, start_time)")
+
+
+def _m013_daily_booking_summary(conn):
+    # Resumo do painel admin por (dia, babysitter, status), mantido pelo db_manager a cada escrita
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS daily_booking_summary (
+            day TEXT NOT NULL,
+            babysitter_id INTEGER NOT NULL,
+            status TEXT NOT NULL,
+            bookings INTEGER NOT NULL,
+            revenue REAL NOT NULL,
+            booked_minutes INTEGER NOT NULL,
+            extension_minutes INTEGER NOT NULL,
+            PRIMARY KEY (day, babysitter_id, status)
+        )
+    ''')
+    # Marcas de retoma dos jobs incrementais (ex: moderation.py)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS summary_watermarks (
+            name TEXT PRIMARY KEY,
+            last_seq INTEGER NOT NULL
+        )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_bookings_date_status ON bookings (service_date, status, total_price)")
+    # Construção inicial a partir das reservas existentes
+    conn.execute("DELETE FROM daily_booking_summary")
+    conn.execute('''
+        INSERT INTO daily_booking_summary
+            (day, babysitter_id, status, bookings, revenue, booked_minutes, extension_minutes)
+        SELECT service_date, babysitter_id, status, count(*), coalesce(sum(total_price), 0),
+               coalesce(sum(duration * 60), 0), coalesce(sum(extension_minutes), 0)
+        FROM bookings GROUP BY service_date, babysitter_id, status
+    ''')
+
+
+def _m014_invoices(conn):
+    # Uma linha por (reserva, hash dos campos faturados): ver invoices.py
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS invoices (
+            booking_id INTEGER NOT NULL REFERENCES bookings (id),
+            billing_hash TEXT NOT NULL,
+            pdf BLOB NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (booking_id, billing_hash)
+        )
+    ''')
+
+
+def _m015_message_flags(conn):
+    # Resultado da moderação offline (moderation.py); a marca de retoma fica em summary_watermarks
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS message_flags (
+            message_id INTEGER PRIMARY KEY REFERENCES messages (id),
+            conversation_id INTEGER,
+            sender_email TEXT NOT NULL,
+            reason TEXT NOT NULL,
+            flagged_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+
+def _m016_service_end_times(conn):
+    # scheduled_end: check-in + duração + extensões aceites; actual_end: quando o serviço terminou
+    for column in ('scheduled_end', 'actual_end'):
+        if not _has_column(conn, 'bookings', column):
+            conn.execute(f"ALTER TABLE bookings ADD COLUMN {column} TEXT")
+    conn.execute('''
+        UPDATE bookings SET
+            scheduled_end = datetime(check_in_time,
+                                     '+' || (duration * 60 + coalesce(extension_minutes, 0)) || ' minutes')
+        WHERE check_in_time IS NOT NULL AND scheduled_end IS NULL
+    ''')
+    # Serviços já terminados: hora registada no evento 'finished' (quando existe)
+    conn.execute('''
+        UPDATE bookings SET actual_end = (
+            SELECT json_extract(e.payload, '$.finished_at') FROM booking_events e
+            WHERE e.booking_id = bookings.id AND e.event_type = 'finished'
+            ORDER BY e.seq DESC LIMIT 1
+        )
+        WHERE status = 'Concluído' AND actual_end IS NULL
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_bookings_status_end ON bookings (status, scheduled_end)")
+
+
+# (versão, descrição, função)
+MIGRATIONS = [
+    (1, "Esquema base (users, bookings, messages)", _m001_base_schema),
+    (2, "bookings.pending_extension", _m002_pending_extension),
+    (3, "Tabela conversations + messages.conversation_id", _m003_conversations),
+    (4, "Contadores de notificações por utilizador", _m004_user_notifications),
+    (5, "Change feed (versões por tópico)", _m005_change_versions),
+    (6, "Log de eventos das reservas (booking_events)", _m006_booking_events),
+    (7, "Cache de geocoding", _m007_geocode_cache),
+    (8, "users.latitude / users.longitude", _m008_user_coordinates),
+    (9, "Grelha geoespacial (users.geo_cell)", _m009_geo_cells),
+    (10, "Intervalo das reservas (start_ts / end_ts)", _m010_booking_intervals),
+    (11, "Índices da listagem paginada de babysitters", _m011_listing_indexes),
+    (12, "Índices das reservas por utilizador + data", _m012_user_booking_date_indexes),
+    (13, "Resumo diário das reservas (painel admin)", _m013_daily_booking_summary),
+    (14, "Cache de faturas PDF (invoices)", _m014_invoices),
+    (15, "Flags da moderação de mensagens", _m015_message_flags),
+    (16, "Fim previsto / real dos serviços (scheduled_end / actual_end)", _m016_service_end_times),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def get_schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn, verbose=False):
+    """
+    Leva a base de dados até LATEST_VERSION.
+    Se já estiver atualizada custa apenas uma leitura do PRAGMA user_version.
+    """
+    current = get_schema_version(conn)
+    if current >= LATEST_VERSION:
+        return current
+
+    for version, description, fn in MIGRATIONS:
+        if version <= current:
+            continue
+
+        def _apply(c, version=version, fn=fn):
+            # Reler dentro do lock: outro processo pode ter migrado entretanto
+            if get_schema_version(c) >= version:
+                return False
+            fn(c)
+            c.execute(f"PRAGMA user_version = {version}")
+            return True
+
+        if run_write(conn, _apply) and verbose:
+            print(f"✅ Migração {version}: {description}")
+
+    return get_schema_version(conn)
+
+
+if __name__ == '__main__':
+    # Uso: python migrations.py [ficheiro.db]
+    conn = connect(sys.argv[1] if len(sys.argv) > 1 else DB_NAME)
+    try:
+        before = get_schema_version(conn)
+        after = migrate(conn, verbose=True)
+        print(f"Esquema na versão {after} (era {before}).")
+    finally:
+        conn.close()
@@ -0,0 +1,162 @@
+import argparse
+import json
+import time
+
+import safety
+from db_config import DB_NAME, connect, run_write
+from migrations import migrate
+
+# ==============================================================================
+# MODERAÇÃO OFFLINE DAS MENSAGENS GUARDADAS
+# ==============================================================================
+# Uso: python moderation.py [ficheiro.db] [--chunk N] [--max N] [--reset]
+#
+# Percorre messages por id (chave primária) em blocos, a partir da última mensagem
+# já processada (summary_watermarks 'moderation'). Cada bloco aplica as mesmas regras
+# do envio (safety.py) e grava, numa única transação, as flags em message_flags e a
+# nova marca: se o job parar a meio, recomeça no bloco seguinte ao último gravado.
+#
+# O estado incremental do filtro é por (conversa, remetente), para apanhar também
+# números/emails partidos em várias mensagens. Por bloco: uma query para os dados
+# (com o pré-filtro '@'/dígitos feito no SQLite) e uma para iniciar os estados novos.
+
+WATERMARK_NAME = 'moderation'
+CHUNK_SIZE = 5000
+HISTORY_SEED = 3          # mensagens anteriores usadas para iniciar o estado de um remetente
+
+# candidate: a mensagem tem '@' ou dígitos (calculado no SQLite, para o bloco inteiro).
+# As restantes não podem violar nenhuma regra: em Python só se guarda o texto.
+_CHUNK_SQL = """
+    SELECT id, conversation_id, sender_email, content, content GLOB '*[0-9@]*' AS candidate
+    FROM messages WHERE id > ? ORDER BY id LIMIT ?
+"""
+
+# Últimas HISTORY_SEED mensagens de cada (conversa, remetente) antes do bloco, numa só query
+# (uma procura em idx_messages_conversation_id por remetente), com as que já têm flag
+_SEED_SQL = """
+    SELECT m.conversation_id, m.sender_email, m.content, f.message_id IS NOT NULL AS flagged
+    FROM json_each(?) k
+    JOIN messages m ON m.id IN (
+        SELECT id FROM messages
+        WHERE conversation_id = json_extract(k.value, '$[0]') AND sender_email = json_extract(k.value, '$[1]')
+          AND id < ?
+        ORDER BY id DESC LIMIT ?
+    )
+    LEFT JOIN message_flags f ON f.message_id = m.id
+    ORDER BY m.id
+"""
+
+
+def get_watermark(conn):
+    row = conn.execute("SELECT last_seq FROM summary_watermarks WHERE name = ?", (WATERMARK_NAME,)).fetchone()
+    return row[0] if row else 0
+
+
+def _seed_states(conn, keys, before_id):
+    """Estado inicial dos remetentes que ainda não têm estado, a partir do histórico anterior ao bloco"""
+    history = {key: [] for key in keys}
+    for conv_id, sender, content, flagged in conn.execute(_SEED_SQL, (json.dumps(keys), before_id, HISTORY_SEED)):
+        # Como em moderate_chunk, uma mensagem com flag recomeça o estado
+        history[(conv_id, sender)] = [] if flagged else history[(conv_id, sender)] + [content]
+    return {key: safety.state_from_history(msgs) for key, msgs in history.items()}
+
+
+def moderate_chunk(conn, rows, states):
+    """
+    rows = [(id, conversation_id, sender_email, content, candidate), ...] por ordem de id.
+    states guarda, por (conversa, remetente), um SafetyState ou o texto da última mensagem
+    sem '@' nem dígitos (o estado só é calculado quando chega uma mensagem candidata).
+    Devolve as flags [(message_id, conversation_id, sender_email, motivo), ...].
+    """
+    new_keys = list({(conv_id, sender) for _, conv_id, sender, _, _ in rows} - states.keys())
+    if new_keys:
+        states.update(_seed_states(conn, new_keys, rows[0][0]))
+
+    flags = []
+    for msg_id, conv_id, sender, content, candidate in rows:
+        key = (conv_id, sender)
+        if not candidate:
+            # Sem dígitos nem '@': o estado seguinte só depende deste texto
+            if content and not content.isspace():
+                states[key] = content
+            continue
+        state = states[key]
+        if isinstance(state, str):
+            state = safety.advance(state, safety.SafetyState())
+        ok, reason, new_state = safety.scan_and_advance(content, state)
+        if ok:
+            states[key] = new_state
+        else:
+            flags.append((msg_id, conv_id, sender, reason))
+            # A violação já fica registada: recomeça o estado para não marcar também a seguinte
+            states[key] = safety.SafetyState()
+    return flags
+
+
+def run_moderation(conn, chunk_size=CHUNK_SIZE, max_messages=None, verbose=False):
+    """Processa as mensagens novas. Devolve {'messages', 'flags', 'last_id', 'seconds'}."""
+    states = {}
+    total = flagged = 0
+    last_id = get_watermark(conn)
+    start = time.perf_counter()
+    while max_messages is None or total < max_messages:
+        limit = chunk_size if max_messages is None else min(chunk_size, max_messages - total)
+        rows = conn.execute(_CHUNK_SQL, (last_id, limit)).fetchall()
+        if not rows:
+            break
+        flags = moderate_chunk(conn, rows, states)
+        chunk_last = rows[-1][0]
+
+        def _write(c, flags=flags, chunk_last=chunk_last):
+            c.executemany("""
+                INSERT OR REPLACE INTO message_flags (message_id, conversation_id, sender_email, reason)
+                VALUES (?, ?, ?, ?)
+            """, flags)
+            c.execute("INSERT OR REPLACE INTO summary_watermarks (name, last_seq) VALUES (?, ?)",
+                      (WATERMARK_NAME, chunk_last))
+        run_write(conn, _write)
+
+        total += len(rows)
+        flagged += len(flags)
+        last_id = chunk_last
+        if verbose:
+            print(f"  ... até id {last_id}: {total} mensagens, {flagged} flag(s)")
+    return {'messages': total, 'flags': flagged, 'last_id': last_id, 'seconds': time.perf_counter() - start}
+
+
+def reset(conn):
+    """Apaga flags e marca (a próxima execução volta a verificar tudo)"""
+    def _write(c):
+        c.execute("DELETE FROM message_flags")
+        c.execute("DELETE FROM summary_watermarks WHERE name = ?", (WATERMARK_NAME,))
+    run_write(conn, _write)
+
+
+def list_flags(conn, after_id=0, limit=100):
+    """Flags para auditoria: [(message_id, sender_email, motivo, conteúdo, timestamp), ...]"""
+    return conn.execute("""
+        SELECT f.message_id, f.sender_email, f.reason, m.content, m.timestamp
+        FROM message_flags f JOIN messages m ON m.id = f.message_id
+        WHERE f.message_id > ? ORDER BY f.message_id LIMIT ?
+    """, (after_id, limit)).fetchall()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Moderação offline das mensagens guardadas")
+    parser.add_argument('db', nargs='?', default=DB_NAME)
+    parser.add_argument('--chunk', type=int, default=CHUNK_SIZE, help="Mensagens por bloco")
+    parser.add_argument('--max', type=int, default=None, help="Parar depois de N mensagens")
+    parser.add_argument('--reset', action='store_true', help="Recomeçar do início")
+    args = parser.parse_args()
+
+    conn = connect(args.db)
+    try:
+        migrate(conn)   # message_flags / summary_watermarks podem ainda não existir
+        if args.reset:
+            reset(conn)
+        result = run_moderation(conn, chunk_size=args.chunk, max_messages=args.max, verbose=True)
+    finally:
+        conn.close()
+    rate = result['messages'] / result['seconds'] if result['seconds'] else 0
+    print(f"✅ {result['messages']} mensagem(ns) verificadas, {result['flags']} flag(s), "
+          f"última id {result['last_id']} ({rate:.0f} mensagens/s).")
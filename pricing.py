@@ -0,0 +1,74 @@
+import numpy as np
+
+# ==============================================================================
+# MOTOR DE PREÇOS (VETORIZADO)
+# ==============================================================================
+# Um único passo NumPy para todas as babysitters candidatas, em vez de um
+# cálculo (geodesic) por linha.
+
+TRAVEL_COST_PER_KM = 0.45
+DEFAULT_ORIGIN = (38.8315, -9.1746)     # Loures: usado se a babysitter não tiver coordenadas
+DEFAULT_DISTANCE_KM = 15.0              # usado se a distância não puder ser calculada
+EARTH_RADIUS_KM = 6371.0088
+
+# Campos do dicionário 'calculo' (igual ao que o checkout e o create_booking já usam)
+QUOTE_FIELDS = ['custo_servico', 'distancia_ida', 'custo_deslocacao', 'total']
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Distância em km entre pontos (aceita escalares ou arrays NumPy)"""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype=float)) for v in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+def compute_quotes(price_per_hour, duracao_horas, job_lat, job_lon, sitter_lat=None, sitter_lon=None):
+    """
+    Versão em arrays: devolve {campo: np.ndarray} para N babysitters.
+    Coordenadas em falta (NaN/None) usam DEFAULT_ORIGIN.
+    """
+    price = np.asarray(price_per_hour, dtype=float)
+    n = price.shape[0] if price.ndim else 1
+    lat = np.full(n, np.nan) if sitter_lat is None else np.asarray(sitter_lat, dtype=float).reshape(n)
+    lon = np.full(n, np.nan) if sitter_lon is None else np.asarray(sitter_lon, dtype=float).reshape(n)
+    missing = np.isnan(lat) | np.isnan(lon)
+    lat = np.where(missing, DEFAULT_ORIGIN[0], lat)
+    lon = np.where(missing, DEFAULT_ORIGIN[1], lon)
+
+    distancia = haversine_km(lat, lon, job_lat, job_lon)
+    distancia = np.where(np.isfinite(distancia), distancia, DEFAULT_DISTANCE_KM)
+
+    custo_servico = price.reshape(n) * duracao_horas
+    custo_deslocacao = distancia * 2 * TRAVEL_COST_PER_KM   # ida e volta
+    return {
+        'custo_servico': custo_servico,
+        'distancia_ida': distancia,
+        'custo_deslocacao': custo_deslocacao,
+        'total': custo_servico + custo_deslocacao,
+    }
+
+
+def price_candidates(df, duracao_horas, job_lat, job_lon, sort_by='total'):
+    """
+    Recebe o DataFrame de get_all_babysitters() e devolve uma cópia com as colunas
+    custo_servico, distancia_ida, custo_deslocacao e total (ordenada por sort_by).
+    """
+    out = df.copy()
+    if out.empty:
+        for field in QUOTE_FIELDS: out[field] = []
+        return out
+    quotes = compute_quotes(
+        out['Preço/Hora'].to_numpy(dtype=float), duracao_horas, job_lat, job_lon,
+        out['latitude'].to_numpy(dtype=float) if 'latitude' in out else None,
+        out['longitude'].to_numpy(dtype=float) if 'longitude' in out else None,
+    )
+    for field in QUOTE_FIELDS:
+        out[field] = quotes[field]
+    if sort_by:
+        out = out.sort_values(sort_by, ascending=(sort_by != 'Avaliação'), kind='stable')
+    return out
+
+
+def quote_from_row(row):
+    """Dicionário 'calculo' a partir de uma linha de price_candidates"""
+    return {field: float(row[field]) for field in QUOTE_FIELDS}
@@ -0,0 +1,103 @@
+import functools
+import threading
+import time
+from collections import OrderedDict
+
+# ==============================================================================
+# CACHE DE QUERIES (TTL + LRU, PARTILHADA PELO PROCESSO)
+# ==============================================================================
+# Cada entrada fica associada a "tags" (ex: 'users', 'bookings').
+# As funções de escrita chamam invalidate(tag): a geração da tag sobe e todas
+# as entradas com a geração antiga deixam de ser válidas (O(1), sem percorrer a cache).
+
+
+class QueryCache:
+    def __init__(self, maxsize=512, default_ttl=60.0):
+        self.maxsize = maxsize
+        self.default_ttl = default_ttl
+        self._entries = OrderedDict()    # chave -> (expira_em, gerações, valor)
+        self._generations = {}
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'stale': 0, 'invalidations': 0, 'evictions': 0}
+
+    def _current(self, tags):
+        return tuple(self._generations.get(t, 0) for t in tags)
+
+    def get(self, key, tags):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, generations, value = entry
+                if expires_at >= time.monotonic() and generations == self._current(tags):
+                    self._entries.move_to_end(key)
+                    self._stats['hits'] += 1
+                    return True, value
+                del self._entries[key]
+                self._stats['stale'] += 1
+            self._stats['misses'] += 1
+            return False, None
+
+    def put(self, key, tags, value, ttl=None, generations=None):
+        with self._lock:
+            # generations = gerações lidas ANTES da query: se houve escrita entretanto, a entrada já nasce inválida
+            gens = generations if generations is not None else self._current(tags)
+            self._entries[key] = (time.monotonic() + (ttl or self.default_ttl), gens, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def snapshot_generations(self, tags):
+        with self._lock:
+            return self._current(tags)
+
+    def invalidate(self, *tags):
+        with self._lock:
+            for tag in tags:
+                self._generations[tag] = self._generations.get(tag, 0) + 1
+            self._stats['invalidations'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot['size'] = len(self._entries)
+        lookups = snapshot['hits'] + snapshot['misses']
+        snapshot['hit_rate'] = snapshot['hits'] / lookups if lookups else 0.0
+        return snapshot
+
+
+def _copy(value):
+    if isinstance(value, tuple):
+        return tuple(_copy(v) for v in value)
+    return value.copy() if hasattr(value, 'copy') else value
+
+
+def cached(cache, tags, ttl=None):
+    """
+    Decorator: guarda o resultado por (função, argumentos).
+    DataFrames/listas/dicts são devolvidos como cópia para o chamador não alterar a cache.
+    Argumentos não "hashable" (ex: listas) passam diretamente à função, sem cache.
+    """
+    tags = tuple(tags)
+
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            key = (fn.__name__, args, tuple(sorted(kwargs.items())))
+            try:
+                hash(key)
+            except TypeError:
+                return fn(*args, **kwargs)
+            hit, value = cache.get(key, tags)
+            if not hit:
+                generations = cache.snapshot_generations(tags)
+                value = fn(*args, **kwargs)
+                cache.put(key, tags, value, ttl, generations)
+            return _copy(value)
+        wrapper.uncached = fn
+        return wrapper
+    return decorator
@@ -0,0 +1,164 @@
+import re
+
+# ==============================================================================
+# FILTRO DE SEGURANÇA DO CHAT (EMAILS / TELEFONES)
+# ==============================================================================
+# Padrões compilados uma única vez. O histórico não é re-analisado: um SafetyState
+# guarda só o que pode continuar na mensagem seguinte (os dígitos do fim da última
+# mensagem e a última "palavra"), por isso cada mensagem custa O(len(mensagem)),
+# mesmo detetando números partidos em várias mensagens ("912 345" + "678").
+#
+# Regra dos telefones: um "número" é uma sequência de grupos de dígitos separados por
+# - espaços, '-', '(', ')' ou '+' ("(+351) 912-345-678");
+# - UM '.', ',', '_' ou '/' entre grupos de 2 a 4 dígitos ("912.345.678", "912/345/678");
+# - UMA palavra curta entre grupos de até 3 dígitos sem '.', ',', '_' ou '/' colados
+#   ("912 abc 345 def 678").
+# Um grupo de 4 dígitos ligado por '.', ',', '_' ou '/' (o ano de "23/12/2025") acaba o
+# número: a data e a hora de "23/12/2025 (21.30)" ficam separadas. É telefone se tiver
+# >= 9 dígitos a começar por 9, 2 ou 3 (depois de um eventual indicativo 351 / 00351);
+# por isso datas (23122025) e horas (2130) passam.
+
+EMAIL_MSG = "Proibido partilhar emails."
+PHONE_MSG = "Proibido partilhar contactos telefónicos."
+
+EMAIL_RE = re.compile(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}\b')
+# Grupos de dígitos com os separadores de um número escrito ("912 345 678", "(+351) 912-345-678")
+DIGIT_RUN_RE = re.compile(r'\d[\d\s\-()+]*')
+NON_DIGIT_RE = re.compile(r'\D')
+# Palavra de enchimento entre dois grupos (o espaço antes já faz parte do grupo anterior)
+FILLER_RE = re.compile(r'[^\W\d_]{1,8}\s*')
+FIRST_GROUP_RE = re.compile(r'\d+')
+LAST_GROUP_RE = re.compile(r'\d+(?=\D*$)')
+LEADING_TOKEN_RE = re.compile(r'\S*')
+TRAILING_TOKEN_RE = re.compile(r'\S*$')
+
+PHONE_MIN_DIGITS = 9
+PHONE_PREFIXES = ('9', '2', '3')      # móveis e fixos portugueses
+COUNTRY_CODES = ('00351', '351')
+FILLER_MAX_GROUP = 3                  # só junta por palavra grupos curtos (anos, preços... não)
+JOINERS = '.,_/'                      # um destes entre dois grupos de JOINER_GROUP dígitos
+JOINER_GROUP = range(2, 5)
+MAX_CARRY = 16                        # dígitos / caracteres guardados entre mensagens
+
+
+class SafetyState:
+    """O que passa de uma mensagem para a seguinte (por conversa)"""
+    __slots__ = ('digits', 'tail')
+
+    def __init__(self, digits='', tail=''):
+        self.digits = digits    # dígitos do número que terminava a mensagem anterior
+        self.tail = tail        # última palavra da mensagem anterior (emails partidos)
+
+    def __repr__(self):
+        return f"SafetyState(digits={self.digits!r}, tail={self.tail!r})"
+
+
+_EMPTY = SafetyState()
+
+
+def _looks_like_phone(digits):
+    for code in COUNTRY_CODES:
+        if digits.startswith(code) and len(digits) - len(code) >= PHONE_MIN_DIGITS:
+            digits = digits[len(code):]
+            break
+    return len(digits) >= PHONE_MIN_DIGITS and digits[0] in PHONE_PREFIXES
+
+
+def _joined_digits(text, prev, match, group):
+    """Quantos dígitos do início de 'group' (o grupo de 'match') continuam o número de 'prev'"""
+    last = LAST_GROUP_RE.search(prev.group())
+    last_len = last.end() - last.start()
+    first_len = FIRST_GROUP_RE.match(match.group()).end()
+    if match.start() - prev.end() == 1 and text[prev.end()] in JOINERS:
+        if last_len not in JOINER_GROUP or first_len not in JOINER_GROUP:
+            return 0
+        # Um ano (4 dígitos) acaba o número: o resto de 'match' começa outro
+        return first_len if first_len > FILLER_MAX_GROUP else len(group)
+    # Palavra entre grupos curtos, nenhum deles parte de uma data/hora ("às 9 ou 24/12")
+    before, after = prev.start() + last.start() - 1, match.start() + first_len
+    if (last_len <= FILLER_MAX_GROUP and first_len <= FILLER_MAX_GROUP
+            and (before < 0 or text[before] not in JOINERS)
+            and (after >= len(text) or text[after] not in JOINERS)
+            and FILLER_RE.fullmatch(text, prev.end(), match.start())):
+        return len(group)
+    return 0
+
+
+def _runs(text, carried_digits):
+    """(dígitos, termina_a_mensagem) de cada número; o primeiro continua o da mensagem anterior"""
+    lead = len(text) - len(text.lstrip()) if carried_digits else -1
+    digits = prev = None
+    for match in DIGIT_RUN_RE.finditer(text):
+        group = NON_DIGIT_RE.sub('', match.group())
+        joined = _joined_digits(text, prev, match, group) if prev is not None else 0
+        if joined:
+            digits += group[:joined]
+            if joined < len(group):
+                yield digits, False
+                digits = group[joined:]
+        else:
+            if digits is not None:
+                yield digits, False
+            digits = carried_digits + group if match.start() == lead else group
+        prev = match
+    if digits is not None:
+        yield digits, prev.end() >= len(text.rstrip())
+
+
+def _scan(text, state, check=True, want_state=True):
+    """Uma passagem pela mensagem: (ok, motivo, novo estado ou None se want_state=False)"""
+    if check:
+        # Emails: na mensagem, ou a última palavra anterior colada à primeira desta ("joao" + "@mail.pt")
+        if EMAIL_RE.search(text):
+            return False, EMAIL_MSG, state
+        if state.tail and EMAIL_RE.search(state.tail + LEADING_TOKEN_RE.match(text).group()):
+            return False, EMAIL_MSG, state
+    trailing = ''
+    for digits, at_end in _runs(text, state.digits):
+        if check and _looks_like_phone(digits):
+            return False, PHONE_MSG, state
+        if at_end:
+            trailing = digits[-MAX_CARRY:]
+    if not want_state:
+        return True, "", None
+    stripped = text.rstrip()
+    if not stripped:
+        return True, "", state
+    return True, "", SafetyState(trailing, TRAILING_TOKEN_RE.search(stripped).group()[-MAX_CARRY * 4:])
+
+
+def advance(text, state):
+    """Novo estado depois de 'text' (sem verificar regras)"""
+    return _scan(text, state, check=False)[2]
+
+
+def scan_message(text, state):
+    """(ok, motivo) para 'text' enviado depois do estado 'state' (não altera o estado)"""
+    return _scan(text, state, want_state=False)[:2]
+
+
+def scan_and_advance(text, state):
+    """(ok, motivo, novo estado) sem alterar 'state'; se a mensagem for bloqueada o estado é 'state'"""
+    return _scan(text, state)
+
+
+def check_message(text, state):
+    """scan_message + avança o estado (in-place) quando a mensagem é aceite"""
+    ok, reason, new_state = scan_and_advance(text, state)
+    if ok:
+        state.digits, state.tail = new_state.digits, new_state.tail
+    return ok, reason
+
+
+def state_from_history(messages):
+    """Estado a partir das mensagens já enviadas (basta passar as últimas)"""
+    state = SafetyState()
+    for text in messages:
+        state = advance(text, state)
+    return state
+
+
+def check_safety_rules(text, history_context=""):
+    """Compatível com a versão antiga: (ok, mensagem de erro)"""
+    state = state_from_history([history_context]) if history_context else _EMPTY
+    return _scan(text, state, want_state=False)[:2]
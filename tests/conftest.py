@@ -0,0 +1,21 @@
+import os
+import sys
+
+import pytest
+
+# Os módulos da aplicação estão na raiz do repositório
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import db_config
+import db_manager as db
+from db_setup import create_database
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    """Base de dados temporária já migrada (com os utilizadores de demonstração); o pool aponta para ela"""
+    path = str(tmp_path / 'test.db')
+    create_database(path)
+    db.configure_pool(path)
+    yield path
+    db.configure_pool(db_config.DB_NAME)
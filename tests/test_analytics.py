@@ -0,0 +1,53 @@
+import subprocess
+import sqlite3
+import sys
+from datetime import date, time
+
+import analytics
+import db_manager as db
+
+SUMMARY_SQL = "SELECT * FROM daily_booking_summary ORDER BY day, babysitter_id, status"
+
+
+def book(day, hour, hours=2, total=20.0):
+    assert db.create_booking(2, {'id': 3}, {
+        'data': day, 'hora': time(hour, 0), 'duracao': hours, 'criancas': 1, 'idades': '3',
+        'morada': 'Rua A', 'obs': '', 'calculo': {'total': total}})
+    return int(db.get_user_bookings(2, 'Cliente', columns=('id',), date_from=day, date_to=day).iloc[0]['id'])
+
+
+def read_summary(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute(SUMMARY_SQL).fetchall()
+    finally:
+        conn.close()
+
+
+def test_summary_is_updated_on_write(db_path):
+    first = book(date(2030, 1, 1), 10)
+    book(date(2030, 1, 1), 18, hours=3, total=30.0)
+    db.start_service_db(first, 'ok')
+    db.extend_service_db(first, 30, 5.0)
+    db.finish_service_db(first)
+
+    summary = read_summary(db_path)
+    assert summary == [('2030-01-01', 3, 'Concluído', 1, 25.0, 120, 30),
+                       ('2030-01-01', 3, 'Confirmado', 1, 30.0, 180, 0)]
+    assert analytics.get_overview()['revenue'] == 55.0
+    # Igual a refazer tudo a partir de bookings
+    db.rebuild_daily_summary()
+    assert read_summary(db_path) == summary
+
+
+def test_rebuild_cli_picks_up_direct_edits(db_path):
+    book(date(2030, 1, 2), 10)
+    conn = sqlite3.connect(db_path)
+    conn.execute("UPDATE bookings SET total_price = 99")   # fora do db_manager: o resumo não sabe
+    conn.commit()
+    conn.close()
+    assert read_summary(db_path)[0][4] == 20.0
+
+    out = subprocess.run([sys.executable, analytics.__file__, '--rebuild', db_path], capture_output=True, text=True)
+    assert out.returncode == 0, out.stderr
+    assert read_summary(db_path)[0][4] == 99.0
@@ -0,0 +1,34 @@
+import sqlite3
+
+import pytest
+
+import db_manager as db
+
+
+@pytest.fixture
+def sitters(db_path):
+    """Além da babysitter de demonstração (id 3): uma sem avaliação e outra sem preço"""
+    conn = sqlite3.connect(db_path)
+    conn.executemany("INSERT INTO users (email, password, name, role, rating, price_per_hour) VALUES (?, '1', ?, 'Babysitter', ?, ?)", [
+        ('sem.rating@email.com', 'Sem Avaliação', None, 12.0),
+        ('sem.preco@email.com', 'Sem Preço', 4.0, None),
+    ])
+    conn.commit()
+    conn.close()
+    db._cache.clear()
+
+
+def all_pages(sort, **filters):
+    names, cursor = [], None
+    while True:
+        df, cursor = db.list_babysitters_page(sort, after=cursor, limit=1, **filters)
+        names += list(df['Nome'])
+        if cursor is None:
+            return names
+
+
+def test_null_rating_and_price_are_listed(sitters):
+    # NULL conta como o valor por omissão da coluna (avaliação 5.0, preço 10.0); desempate por id
+    assert all_pages('rating') == ['Maria Oliveira', 'Sem Avaliação', 'Sem Preço']
+    assert all_pages('price') == ['Maria Oliveira', 'Sem Preço', 'Sem Avaliação']
+    assert all_pages('price', max_price=10.0) == ['Maria Oliveira', 'Sem Preço']
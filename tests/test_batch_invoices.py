@@ -0,0 +1,22 @@
+import pytest
+
+from batch_invoices import period_bounds
+
+
+@pytest.mark.parametrize('args, expected', [
+    (('2025-11',), ('2025-11-01', '2025-11-30')),
+    (('2024-02',), ('2024-02-01', '2024-02-29')),
+    (('2025-12',), ('2025-12-01', '2025-12-31')),
+    (('2025-11', '2025-11-30'), ('2025-11-01', '2025-11-30')),
+    (('2025-10', '2025-11'), ('2025-10-01', '2025-11-30')),
+    (('2025-11-01', '2025-11-15'), ('2025-11-01', '2025-11-15')),
+    (('2025-11-15',), ('2025-11-15', '2025-11-15')),
+])
+def test_period_bounds(args, expected):
+    assert period_bounds(*args) == expected
+
+
+@pytest.mark.parametrize('args', [('2025-13',), ('novembro',), ('2025-11-30', '2025-11-01')])
+def test_invalid_period_raises_value_error(args):
+    with pytest.raises(ValueError):
+        period_bounds(*args)
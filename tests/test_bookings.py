@@ -0,0 +1,19 @@
+from datetime import date, time
+
+import pytest
+
+import db_manager as db
+
+
+def form(hour, hours=2):
+    return {'data': date(2030, 1, 1), 'hora': time(hour, 0), 'duracao': hours, 'criancas': 1, 'idades': '3',
+            'morada': 'Rua A', 'obs': '', 'calculo': {'total': 20.0}}
+
+
+def test_overlapping_booking_raises_conflict(db_path):
+    assert db.create_booking(2, {'id': 3}, form(10))
+    with pytest.raises(db.BookingConflictError):
+        db.create_booking(2, {'id': 3}, form(11))
+    # Logo a seguir ao fim da primeira já pode
+    assert db.create_booking(2, {'id': 3}, form(12))
+    assert db.count_user_bookings(3, 'Babysitter')['future'] == 2
@@ -0,0 +1,48 @@
+import subprocess
+import sys
+
+import pytest
+
+import db_manager as db
+import moderation
+from db_config import connect
+
+CLIENT, SITTER = 'cliente@email.com', 'baba@email.com'
+
+
+@pytest.fixture
+def conn(db_path):
+    c = connect(db_path)
+    yield c
+    c.close()
+
+
+def flagged_contents(conn):
+    return [row[3] for row in moderation.list_flags(conn)]
+
+
+def test_number_split_across_chunks(conn):
+    for text in ["Olá!", "o meu número é 912", "Bom dia", "345", "678", "obrigada"]:
+        sender, receiver = (CLIENT, SITTER) if text != "Bom dia" else (SITTER, CLIENT)
+        db.send_message_db(sender, receiver, text)
+    # Blocos de 1 mensagem: o estado de cada remetente vem sempre do histórico (query de arranque)
+    result = moderation.run_moderation(conn, chunk_size=1)
+    assert result['messages'] == 6
+    assert flagged_contents(conn) == ["678"]
+
+
+def test_resumes_after_watermark(conn):
+    db.send_message_db(CLIENT, SITTER, "escreve para ana.silva@gmail.com")
+    assert moderation.run_moderation(conn)['flags'] == 1
+    db.send_message_db(CLIENT, SITTER, "Dia 23/12/2025 (21.30)")
+    db.send_message_db(CLIENT, SITTER, "Liga 912 345 678")
+    result = moderation.run_moderation(conn)
+    assert (result['messages'], result['flags']) == (2, 1)
+    assert flagged_contents(conn) == ["escreve para ana.silva@gmail.com", "Liga 912 345 678"]
+
+
+def test_cli_migrates_a_new_database(tmp_path):
+    path = str(tmp_path / 'vazia.db')
+    out = subprocess.run([sys.executable, moderation.__file__, path], capture_output=True, text=True)
+    assert out.returncode == 0, out.stderr
+    assert "0 mensagem(ns) verificadas" in out.stdout
@@ -0,0 +1,122 @@
+import sqlite3
+from datetime import date, time
+
+import pytest
+
+import analytics
+import db_manager as db
+from db_indexes import missing_indexes, table_scans
+
+CLIENT = ('cliente@email.com', 2)
+SITTER = ('baba@email.com', 3)
+
+# Funções chamadas em todos os reruns (dashboards, chat, wizard, painel admin).
+# O SQL verificado é o que elas executam, capturado na ligação do pool.
+HOT_CALLS = {
+    'get_user_bookings (Cliente, passado)': lambda ids: db.get_user_bookings(ids['client'], 'Cliente', when='past', limit=3),
+    'get_user_bookings (Babysitter, futuro)': lambda ids: db.get_user_bookings(ids['sitter'], 'Babysitter', when='future'),
+    'count_user_bookings': lambda ids: db.count_user_bookings(ids['client'], 'Cliente'),
+    'get_upcoming_or_active_booking (Cliente)': lambda ids: db.get_upcoming_or_active_booking(ids['client'], 'Cliente'),
+    'get_upcoming_or_active_booking (Babysitter)': lambda ids: db.get_upcoming_or_active_booking(ids['sitter'], 'Babysitter'),
+    'get_active_services': lambda ids: db.get_active_services(),
+    'get_active_services (Babysitter)': lambda ids: db.get_active_services(ids['sitter'], 'Babysitter'),
+    'get_active_service': lambda ids: db.get_active_service(ids['booking']),
+    'get_all_babysitters': lambda ids: db.get_all_babysitters(),
+    'get_available_babysitters': lambda ids: db.get_available_babysitters(date(2030, 1, 1), time(10, 0), 2),
+    'list_babysitters_page (rating)': lambda ids: db.list_babysitters_page('rating', after=(5.0, 1)),
+    'list_babysitters_page (price)': lambda ids: db.list_babysitters_page('price', after=(10.0, 1)),
+    'find_nearest_babysitters': lambda ids: db.find_nearest_babysitters(38.72, -9.14, available_for=('2030-01-01 10:00:00', '2030-01-01 12:00:00')),
+    'get_user_profile': lambda ids: db.get_user_profile(ids['client']),
+    'verify_login': lambda ids: db.verify_login(CLIENT[0], '123'),
+    'get_conversation_id': lambda ids: db.get_conversation_id(CLIENT[0], SITTER[0]),
+    'get_user_conversations': lambda ids: db.get_user_conversations(CLIENT[0]),
+    'get_notification_summary': lambda ids: db.get_notification_summary(SITTER[0]),
+    'get_messages_since': lambda ids: db.get_messages_since(ids['conversation'], 0),
+    'get_messages_before': lambda ids: db.get_messages_before(ids['conversation']),
+    'get_booking_events_since (reserva)': lambda ids: db.get_booking_events_since(0, booking_id=ids['booking']),
+    'analytics.top_sitters': lambda ids: analytics.top_sitters(),
+    'analytics.list_transactions': lambda ids: analytics.list_transactions(after_id=ids['booking'] + 1),
+}
+
+
+@pytest.fixture
+def seeded(db_path):
+    """Reserva em curso, coordenadas e uma conversa nos utilizadores de demonstração"""
+    client_id, sitter_id = CLIENT[1], SITTER[1]
+    db.set_user_location(client_id, 38.72, -9.14)
+    db.set_user_location(sitter_id, 38.73, -9.15)
+    assert db.create_booking(client_id, {'id': sitter_id}, {
+        'data': date.today(), 'hora': time(0, 0), 'duracao': 2, 'criancas': 1, 'idades': '3',
+        'morada': 'Rua A', 'obs': '', 'calculo': {'total': 20.0}})
+    booking_id = db.get_user_bookings(client_id, 'Cliente', columns=('id',)).iloc[0]['id']
+    db.start_service_db(int(booking_id), 'ok')
+    db.send_message_db(CLIENT[0], SITTER[0], "Olá!")
+    db.send_message_db(SITTER[0], CLIENT[0], "Bom dia")
+    return {'client': client_id, 'sitter': sitter_id, 'booking': int(booking_id),
+            'conversation': db.get_conversation_id(CLIENT[0], SITTER[0])}
+
+
+def capture_sql(fn, kinds=('SELECT', 'WITH')):
+    """Corre fn() e devolve as instruções executadas nas ligações do pool que começam
+    por um dos 'kinds' (já com os valores)"""
+    statements = []
+    conn = db.get_connection()
+    try:
+        conn.set_trace_callback(statements.append)
+        try:
+            fn()
+        finally:
+            conn.set_trace_callback(None)
+    finally:
+        conn.close()
+    return [s for s in statements if s.lstrip().upper().startswith(kinds)]
+
+
+@pytest.mark.parametrize('name', sorted(HOT_CALLS))
+def test_hot_query_has_no_table_scan(seeded, db_path, name):
+    # A cache de dados de referência esconderia o SQL: cada chamada vai à BD
+    db._cache.clear()
+    statements = capture_sql(lambda: HOT_CALLS[name](seeded))
+    assert statements, f"{name} não executou nenhum SELECT"
+
+    plan_conn = sqlite3.connect(db_path)
+    try:
+        problems = {sql: table_scans(plan_conn, sql) for sql in statements}
+    finally:
+        plan_conn.close()
+    problems = {sql: scans for sql, scans in problems.items() if scans}
+    assert not problems, f"{name} faz SCAN: {problems}"
+
+
+def test_summary_update_has_no_table_scan(seeded, db_path):
+    # Corre em todas as escritas de reservas: só as linhas da babysitter nesse dia
+    statements = capture_sql(lambda: db.extend_service_db(seeded['booking'], 30, 5.0),
+                             kinds=('INSERT INTO DAILY_BOOKING_SUMMARY', 'DELETE FROM DAILY_BOOKING_SUMMARY'))
+    assert len(statements) == 2
+
+    plan_conn = sqlite3.connect(db_path)
+    try:
+        assert all(table_scans(plan_conn, sql, tables=('bookings', 'daily_booking_summary')) == []
+                   for sql in statements)
+    finally:
+        plan_conn.close()
+
+
+def test_table_scans_resolves_aliases(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        assert table_scans(conn, "SELECT b.id FROM bookings b WHERE b.notes = 'x'") == ['SCAN b']
+        assert table_scans(conn, "SELECT b.id FROM bookings AS b WHERE b.client_id = 1") == []
+        # Tabelas fora de PLAN_TABLES não contam
+        assert table_scans(conn, "SELECT topic FROM change_versions") == []
+    finally:
+        conn.close()
+
+
+def test_migrations_create_every_catalog_index(db_path):
+    # As migrações têm o seu próprio CREATE INDEX: o catálogo não pode divergir delas
+    conn = sqlite3.connect(db_path)
+    try:
+        assert missing_indexes(conn) == []
+    finally:
+        conn.close()
@@ -0,0 +1,69 @@
+import pytest
+
+import safety
+
+
+@pytest.mark.parametrize('text', [
+    "Liga-me para o 912 345 678",
+    "(+351) 912-345-678",
+    "00351912345678",
+    "22 123 45 67",
+    # Grupos curtos separados por uma palavra (tentativa de contornar o filtro)
+    "912 abc 345 def 678",
+    "912abc345def678",
+    "9 1 2 e 345 e 678",
+    "ligue 912.345.678",
+    "912,345,678",
+    "912/345/678",
+    "912_345_678",
+    "912 345.678",
+])
+def test_phone_numbers_are_blocked(text):
+    assert safety.check_safety_rules(text) == (False, safety.PHONE_MSG)
+
+
+@pytest.mark.parametrize('text', [
+    "Dia 23/12/2025 (21.30)",
+    "Chego às 21.30, dia 12/03",
+    "Dia 23/12/2025 21.30 ou 24/12/2025 às 9.30",
+    "Custa 1.250,50€",
+    "às 9 ou 24/12/2025",
+    "entre 2023 e 2024 e 2025",
+    "das 9 às 12 e das 14 às 18",
+    "Rua 25 de Abril nº 234, 3º esq",
+    "O preço fica em 15€ por hora, 3 horas",
+    "O Tomás tem 4 anos e deita-se às 21h",
+    "123456789",            # 9 dígitos mas não começa por 9/2/3
+])
+def test_dates_times_and_addresses_pass(text):
+    assert safety.check_safety_rules(text) == (True, "")
+
+
+def test_emails_are_blocked():
+    assert safety.check_safety_rules("escreve para ana.silva@gmail.com") == (False, safety.EMAIL_MSG)
+
+
+def test_number_split_across_messages():
+    state = safety.SafetyState()
+    assert safety.check_message("o meu número é 912", state) == (True, "")
+    assert safety.check_message("345", state) == (True, "")
+    assert safety.check_message("678", state) == (False, safety.PHONE_MSG)
+
+
+def test_email_split_across_messages():
+    state = safety.SafetyState()
+    assert safety.check_message("escreve para joao.m", state) == (True, "")
+    assert safety.check_message("@sapo.pt", state) == (False, safety.EMAIL_MSG)
+
+
+def test_blocked_message_does_not_change_state():
+    state = safety.SafetyState()
+    safety.check_message("liga 912", state)
+    assert safety.check_message("345 678 000", state)[0] is False
+    assert (state.digits, state.tail) == ('912', '912')
+
+
+def test_history_wrapper_matches_incremental_state():
+    history = "o meu número é 912 345"
+    assert safety.check_safety_rules("678", history) == (False, safety.PHONE_MSG)
+    assert safety.check_safety_rules("678") == (True, "")